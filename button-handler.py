@@ -7,11 +7,15 @@ import signal
 import psutil
 import threading
 import socket
+import queue
 from datetime import datetime, timedelta
-from enum import Enum
 from typing import Optional, Dict, Any
 from gpiozero import Button, LED, GPIOPinInUse, BadPinFactory
 from dotenv import load_dotenv
+from fleet_coordinator import make_coordinator, HostLease, CoordinatorError, EVENT_HOST_AWAKE
+from stream_state import StreamState
+from state_journal import StateJournal
+from performance_profile import PerformanceProfile, parse_cpu_list
 
 # Load environment variables
 load_dotenv()
@@ -26,15 +30,22 @@ HEALTH_CHECK_INTERVAL = int(os.getenv("HEALTH_CHECK_INTERVAL", "30"))  # seconds
 CONNECTION_TIMEOUT = int(os.getenv("CONNECTION_TIMEOUT", "10"))  # seconds
 MAX_RESTART_ATTEMPTS = int(os.getenv("MAX_RESTART_ATTEMPTS", "3"))
 PROCESS_CHECK_INTERVAL = int(os.getenv("PROCESS_CHECK_INTERVAL", "5"))  # seconds
-
-class StreamState(Enum):
-    """Enumeration for stream states"""
-    IDLE = "idle"
-    STARTING = "starting"
-    RUNNING = "running"
-    STOPPING = "stopping"
-    ERROR = "error"
-    UNKNOWN = "unknown"
+COORDINATOR_URL = os.getenv("COORDINATOR_URL", "")  # empty disables fleet coordination
+COORDINATOR_TIMEOUT = float(os.getenv("COORDINATOR_TIMEOUT", "2"))  # seconds
+COORDINATOR_MAX_BACKOFF = float(os.getenv("COORDINATOR_MAX_BACKOFF", "60"))  # seconds between retries while down
+UNIT_ID = os.getenv("UNIT_ID", socket.gethostname())
+LEASE_TTL = int(os.getenv("LEASE_TTL", "300"))  # seconds
+HOST_AWAKE_WINDOW = int(os.getenv("HOST_AWAKE_WINDOW", "120"))  # seconds
+STATE_JOURNAL_FILE = os.getenv("STATE_JOURNAL_FILE", "./button-handler.state")
+JOURNAL_FLUSH_INTERVAL = float(os.getenv("JOURNAL_FLUSH_INTERVAL", "1"))  # seconds
+PERF_PROFILE = os.getenv("PERF_PROFILE", "false").lower() == "true"
+PERF_MOONLIGHT_CPUS = os.getenv("PERF_MOONLIGHT_CPUS", "")  # e.g. "2,3" or "1-3"; empty disables pinning
+PERF_SCHED_POLICY = os.getenv("PERF_SCHED_POLICY", "nice")  # fifo, nice or none
+PERF_RT_PRIORITY = int(os.getenv("PERF_RT_PRIORITY", "10"))  # SCHED_FIFO priority (1-99)
+PERF_NICE = int(os.getenv("PERF_NICE", "-5"))
+PERF_DECODER_THREADS = os.getenv("PERF_DECODER_THREADS", "")  # regex on thread names; empty = all threads
+PERF_LOG_IONICE = os.getenv("PERF_LOG_IONICE", "idle")  # idle, low or none
+PERF_CPU_GOVERNOR = os.getenv("PERF_CPU_GOVERNOR", "")  # e.g. "performance"; empty leaves it alone
 
 class ButtonHandler:
     """Enhanced button handler with comprehensive error handling and monitoring"""
@@ -50,13 +61,39 @@ class ButtonHandler:
         self.restart_attempts = 0
         self.last_health_check = None
         self.process_monitor_thread = None
+        self.coordinator = None
+        self.coordinator_registered = False
+        self.coordinator_queue = None
+        self.coordinator_thread = None
+        self.coordinator_lock = threading.Lock()
+        self.coordinator_backoff = 0.0
+        self.coordinator_retry_at = 0.0
+        self.lease = None
+        self.event_seq = 0
+        self.host_awake_at = None
+        self.host_reachable = None
+        self.metrics = {}
+        self.journal = None
+        self.moonlight_pid = None
+        self.moonlight_start_ticks = None
+        self.session_started_at = None
+        self.launch_process = None
+        self.performance_profile = None
         
         # Initialize components
         self._setup_logging()
         self._setup_hardware()
+        self._setup_performance_profile()
+        self._restore_state()
         self._setup_signal_handlers()
+        self._setup_coordinator()
         self._start_monitoring()
         
+        # Tune an adopted session once every handler thread exists, so they are all isolated
+        if self.current_state == StreamState.RUNNING:
+            self._apply_performance_profile()
+            self._journal_state()
+        
     def _setup_logging(self):
         """Setup comprehensive logging with multiple levels and handlers"""
         self.logger = logging.getLogger("ButtonHandler")
@@ -132,16 +169,422 @@ class ButtonHandler:
         except Exception as e:
             self.logger.warning(f"LED test failed: {e}")
             
+    def _setup_performance_profile(self):
+        """Prepare the CPU/IO tuning applied while a stream is running"""
+        if not PERF_PROFILE:
+            self.logger.debug("Performance profile disabled")
+            return
+            
+        try:
+            self.performance_profile = PerformanceProfile(
+                self.logger,
+                moonlight_cpus=parse_cpu_list(PERF_MOONLIGHT_CPUS),
+                sched_policy=PERF_SCHED_POLICY,
+                rt_priority=PERF_RT_PRIORITY,
+                nice=PERF_NICE,
+                decoder_thread_pattern=PERF_DECODER_THREADS,
+                handler_ionice=PERF_LOG_IONICE,
+                cpu_governor=PERF_CPU_GOVERNOR
+            )
+            self.logger.info(f"Performance profile enabled: CPUs={PERF_MOONLIGHT_CPUS or 'any'}, "
+                             f"sched={PERF_SCHED_POLICY}, log I/O={PERF_LOG_IONICE}, "
+                             f"governor={PERF_CPU_GOVERNOR or 'unchanged'}")
+        except Exception as e:
+            self.logger.error(f"Invalid performance profile configuration: {e}")
+            
+    def _apply_performance_profile(self):
+        """Tune scheduling for the running Moonlight session"""
+        if not self.performance_profile or not self.moonlight_pid:
+            return
+            
+        try:
+            self.performance_profile.apply(self.moonlight_pid)
+        except Exception as e:
+            self.logger.error(f"Failed to apply performance profile: {e}")
+            
+    def _revert_performance_profile(self):
+        """Undo session tuning"""
+        if not self.performance_profile:
+            return
+            
+        try:
+            self.performance_profile.revert()
+        except Exception as e:
+            self.logger.error(f"Failed to revert performance profile: {e}")
+            
+    def _refresh_performance_profile(self):
+        """Tune Moonlight threads started after the profile was applied (decoders start with the stream)"""
+        if not self.performance_profile or self.current_state != StreamState.RUNNING or not self.moonlight_pid:
+            return
+            
+        try:
+            if self.performance_profile.refresh(self.moonlight_pid):
+                self._journal_state()
+        except Exception as e:
+            self.logger.error(f"Failed to refresh performance profile: {e}")
+            
+    def _restore_state(self):
+        """Restore state from the journal and re-adopt a still-running session"""
+        start_time = time.time()
+        saved = StateJournal.load(STATE_JOURNAL_FILE)
+        
+        if saved is None:
+            self.logger.debug(f"No usable state journal at {STATE_JOURNAL_FILE}, starting IDLE")
+        else:
+            self.restart_attempts = saved.get("restart_attempts", 0)
+            saved_state = saved.get("state", StreamState.IDLE.value)
+            
+            # Values the last session's profile replaced; reading them now would return the tuned ones
+            originals = saved.get("performance_originals")
+            if self.performance_profile:
+                self.performance_profile.adopt(originals)
+            
+            if saved_state in [StreamState.RUNNING.value, StreamState.STARTING.value, StreamState.STOPPING.value]:
+                pid, start_ticks = saved.get("pid"), saved.get("pid_start_ticks")
+                if pid is None:
+                    # Restarted mid-launch: the PID was not journaled yet
+                    pid, start_ticks = self._read_moonlight_pid()
+                    
+                if saved.get("host") == MOONLIGHT_HOST and self._adopt_session(pid, start_ticks):
+                    self.session_started_at = saved.get("session_started_at")
+                    self.current_state = StreamState.RUNNING
+                    self._state_change_time = datetime.now()
+                else:
+                    self.logger.info(f"Journaled {saved_state} session is gone, starting IDLE")
+            elif saved_state == StreamState.ERROR.value:
+                self.current_state = StreamState.ERROR
+                self._state_change_time = datetime.now()
+                
+            if self.performance_profile is None and originals:
+                # Profile disabled (or misconfigured) since the last run: still undo what it left behind
+                leftover = PerformanceProfile(self.logger)
+                leftover.adopt(originals)
+                leftover.revert_saved(self.moonlight_pid if self.current_state == StreamState.RUNNING else None)
+            elif self.performance_profile and self.current_state != StreamState.RUNNING:
+                self.performance_profile.revert_saved()
+                
+        self.journal = StateJournal(
+            STATE_JOURNAL_FILE,
+            flush_interval=JOURNAL_FLUSH_INTERVAL,
+            on_error=lambda e: self.logger.error(f"State journal write failed: {e}")
+        )
+        self.journal.start(self._journal_fields())
+        self.journal.flush()
+        self._set_led_state()
+        
+        elapsed_ms = (time.time() - start_time) * 1000
+        self.logger.info(f"State restored in {elapsed_ms:.1f}ms: {self.current_state.value}")
+        
+    def _adopt_session(self, pid: Optional[int], start_ticks: Optional[int]) -> bool:
+        """Check that a journaled Moonlight PID is the same live process and take it over"""
+        if not pid or start_ticks is None:
+            return False
+            
+        # PIDs get reused; the start time proves it is the same process
+        if self._read_start_ticks(pid) != start_ticks:
+            self.logger.debug(f"PID {pid} is gone or was reused by another process")
+            return False
+            
+        try:
+            process = psutil.Process(pid)
+            if 'moonlight' not in ' '.join(process.cmdline()).lower():
+                return False
+                
+            if process.status() in [psutil.STATUS_ZOMBIE, psutil.STATUS_DEAD]:
+                return False
+                
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return False
+            
+        self.moonlight_pid = pid
+        self.moonlight_start_ticks = start_ticks
+        
+        # The launch script may not have written (or we may have cleaned up) the PID file
+        if not os.path.exists(PID_FILE):
+            try:
+                with open(PID_FILE, 'w') as f:
+                    f.write(str(pid))
+                self.logger.debug(f"PID file recreated for adopted process {pid}")
+            except Exception as e:
+                self.logger.error(f"Failed to recreate PID file: {e}")
+                
+        self.logger.info(f"Re-adopted running Moonlight session (PID: {pid})")
+        return True
+        
+    def _read_moonlight_pid(self):
+        """Return (pid, start_ticks) of the process in PID_FILE, or (None, None)"""
+        try:
+            with open(PID_FILE, 'r') as f:
+                pid = int(f.read().strip())
+        except (OSError, ValueError):
+            return None, None
+            
+        start_ticks = self._read_start_ticks(pid)
+        return (pid, start_ticks) if start_ticks is not None else (None, None)
+        
+    def _read_start_ticks(self, pid: int) -> Optional[int]:
+        """Process start time in clock ticks after boot (/proc/<pid>/stat field 22)"""
+        # Unlike psutil's create_time() this does not go through the wall-clock boot time,
+        # which shifts by whole seconds when NTP steps the clock
+        try:
+            with open(f"/proc/{pid}/stat", 'r') as f:
+                stat = f.read()
+            # The command name (field 2) may contain spaces and ')'; field 3 follows the last ')'
+            return int(stat.rsplit(")", 1)[1].split()[19])
+        except (OSError, ValueError, IndexError):
+            return None
+            
+    def _journal_fields(self) -> Dict[str, Any]:
+        """Current state as stored in the journal"""
+        return {
+            "state": self.current_state.value,
+            "pid": self.moonlight_pid,
+            "pid_start_ticks": self.moonlight_start_ticks,
+            "host": MOONLIGHT_HOST,
+            "session_started_at": self.session_started_at,
+            "restart_attempts": self.restart_attempts,
+            "performance_originals": self.performance_profile.originals if self.performance_profile else {},
+        }
+        
+    def _journal_state(self):
+        """Queue the current state for the next batched journal write"""
+        if self.journal:
+            self.journal.record(**self._journal_fields())
+            
     def _setup_signal_handlers(self):
         """Setup signal handlers for graceful shutdown"""
         def signal_handler(signum, frame):
             signal_name = signal.Signals(signum).name
             self.logger.info(f"Received signal {signal_name}. Initiating graceful shutdown...")
+            
+            # KillMode=process leaves Moonlight and the launch script alone, so a service stop
+            # has to end them itself
+            if signum == signal.SIGTERM and os.getenv("INVOCATION_ID"):
+                if self.current_state == StreamState.RUNNING:
+                    if self._is_service_restart():
+                        self.logger.info("Service is restarting, leaving the stream running for re-adoption")
+                    else:
+                        self.logger.info("Service is stopping, ending the stream")
+                        self._stop_stream()
+                elif self.current_state in [StreamState.STARTING, StreamState.STOPPING]:
+                    # A half-started session can't be re-adopted, so this applies to restarts too
+                    self.logger.info(f"Service is stopping while {self.current_state.value}, ending the launch script")
+                    self._abort_transition()
+                    
             self.shutdown()
             
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
         
+    def _is_service_restart(self) -> bool:
+        """Check whether systemd is restarting (rather than stopping) our service unit"""
+        try:
+            with open("/proc/self/cgroup", 'r') as f:
+                units = [part for part in f.read().replace("\n", "/").split("/") if part.endswith(".service")]
+            if not units:
+                return False
+                
+            # Columns: JOB UNIT TYPE STATE
+            result = subprocess.run(
+                ["systemctl", "list-jobs", "--no-legend", units[-1]],
+                capture_output=True,
+                text=True,
+                timeout=5
+            )
+            return any(line.split()[2:3] == ["restart"] for line in result.stdout.splitlines())
+            
+        except (OSError, subprocess.SubprocessError) as e:
+            self.logger.warning(f"Could not query systemd job, treating SIGTERM as a stop: {e}")
+            return False
+            
+    def _setup_coordinator(self):
+        """Connect to the optional fleet coordinator shared with other units"""
+        if not COORDINATOR_URL:
+            self.logger.debug("No COORDINATOR_URL configured, running standalone")
+            return
+            
+        self.coordinator = make_coordinator(COORDINATOR_URL, timeout=COORDINATOR_TIMEOUT)
+        self.lease = HostLease(self.coordinator, UNIT_ID, MOONLIGHT_HOST, LEASE_TTL)
+        # Reports, broadcasts and event polls go through a background thread (registration included)
+        self.coordinator_queue = queue.Queue(maxsize=100)
+        self.logger.info(f"Fleet coordinator: {COORDINATOR_URL} (unit: {UNIT_ID}, lease TTL: {LEASE_TTL}s)")
+        
+        # A session re-adopted from the journal keeps its claim on the host
+        if self.current_state == StreamState.RUNNING:
+            if not self._acquire_host_lease(reclaim=True):
+                self.logger.error("Could not reclaim host lease for the running session, retrying on next health check")
+        
+    def _register_with_coordinator(self):
+        """Register this unit; retried from the health monitor until it succeeds"""
+        result = self._coordinator_call("register", self.coordinator.register, UNIT_ID, {"host": MOONLIGHT_HOST})
+        if result is None:
+            return
+            
+        self.coordinator_registered = True
+        # Only react to events published after we joined
+        self.event_seq = result.get("event_seq", 0)
+        self.logger.info(f"Registered with fleet coordinator as '{UNIT_ID}'")
+        self._report_to_coordinator()
+        
+    def _coordinator_call(self, description: str, func, *args, force: bool = False):
+        """Call the coordinator, logging failures instead of raising (coordination is best-effort)"""
+        # While the coordinator is down, only forced calls (lease acquire) wait on the network
+        if not force and time.time() < self.coordinator_retry_at:
+            return None
+            
+        start_time = time.time()
+        try:
+            result = func(*args)
+        except CoordinatorError as e:
+            self._coordinator_failed(description, e)
+            return None
+        except Exception as e:
+            self.logger.error(f"Unexpected fleet coordinator error during {description}: {e}")
+            return None
+            
+        self.metrics["coordinator_rtt_ms"] = round((time.time() - start_time) * 1000, 1)
+        with self.coordinator_lock:
+            recovered = self.coordinator_backoff > 0
+            self.coordinator_backoff = 0.0
+            self.coordinator_retry_at = 0.0
+        if recovered:
+            self.logger.info("Fleet coordinator is reachable again")
+        return result
+        
+    def _coordinator_failed(self, description: str, error: Exception):
+        """Back off exponentially and log an outage once instead of on every call"""
+        with self.coordinator_lock:
+            first_failure = self.coordinator_backoff == 0
+            self.coordinator_backoff = min(max(self.coordinator_backoff * 2, 1.0), COORDINATOR_MAX_BACKOFF)
+            self.coordinator_retry_at = time.time() + self.coordinator_backoff
+            backoff = self.coordinator_backoff
+            
+        if first_failure:
+            self.logger.warning(f"Fleet coordinator {description} failed, continuing standalone until it recovers: {error}")
+        else:
+            self.logger.debug(f"Fleet coordinator {description} failed, retrying in {backoff:.0f}s: {error}")
+            
+    def _queue_coordinator_call(self, description: str, func, *args):
+        """Hand an update to the coordinator thread so state changes never wait on the network"""
+        if self.coordinator_queue is None:
+            return
+            
+        try:
+            self.coordinator_queue.put_nowait((description, func, args))
+        except queue.Full:
+            self.logger.debug(f"Coordinator queue full, dropping {description}")
+            
+    def _coordinator_worker(self):
+        """Background thread sending queued coordinator updates and polling events"""
+        next_poll = 0.0
+        while True:
+            stopping = self.shutdown_event.is_set()
+            try:
+                item = self.coordinator_queue.get(timeout=1.0 if stopping else max(0.0, next_poll - time.time()))
+                if item is None:
+                    return  # Sentinel from shutdown(); everything queued before it was sent
+                description, func, args = item
+                self._coordinator_call(description, func, *args)
+            except queue.Empty:
+                if stopping:
+                    return
+            except Exception as e:
+                self.logger.error(f"Coordinator worker error: {e}")
+                
+            if time.time() >= next_poll and not self.shutdown_event.is_set():
+                if not self.coordinator_registered:
+                    self._register_with_coordinator()
+                self._poll_coordinator_events()
+                next_poll = time.time() + PROCESS_CHECK_INTERVAL
+                
+    def _report_to_coordinator(self):
+        """Queue the current state and latency metrics for the coordinator"""
+        if not self.coordinator_registered:
+            return
+            
+        self._queue_coordinator_call("report", self.coordinator.report, UNIT_ID, self.current_state.value, dict(self.metrics))
+        
+    def _acquire_host_lease(self, reclaim: bool = False) -> bool:
+        """Lease MOONLIGHT_HOST so no other unit starts a session on it"""
+        if not self.coordinator:
+            return True
+            
+        # Synchronous even while backing off: starting without a lease risks sharing the PC
+        granted = self._coordinator_call("lease", self.lease.acquire, reclaim, force=True)
+        if granted is None:
+            self.logger.warning("Fleet coordinator unavailable, starting without host lease")
+            return True
+            
+        if not granted:
+            if self.lease.holder is None:
+                self.logger.warning("Fleet coordinator restarted recently and is waiting for running units to reclaim their hosts")
+            else:
+                self.logger.warning(f"Host {MOONLIGHT_HOST} is leased by unit '{self.lease.holder}'")
+            return False
+            
+        self.logger.info(f"Host lease acquired for {MOONLIGHT_HOST}")
+        return True
+        
+    def _maintain_host_lease(self):
+        """Renew the host lease while a session is running, re-acquiring it if the coordinator lost it"""
+        if not self.coordinator_registered or self.current_state != StreamState.RUNNING:
+            return
+        if not self.lease.held and self.lease.holder not in [None, UNIT_ID]:
+            return  # Given up for this session: another unit holds the host
+            
+        was_held = self.lease.held
+        held = self._coordinator_call("lease renewal", self.lease.maintain)
+        if held is None:
+            return
+            
+        if held and not was_held:
+            self.logger.info(f"Host lease re-acquired for {MOONLIGHT_HOST}")
+        elif not held and self.lease.holder is not None:
+            self.logger.error(f"Host lease for {MOONLIGHT_HOST} is held by unit '{self.lease.holder}' while this unit is streaming")
+        elif not held:
+            self.logger.warning("Host lease not reclaimed yet, retrying on next health check")
+            
+    def _release_host_lease(self):
+        """Release the host lease once the session is over"""
+        if not self.lease or not self.lease.held:
+            return
+            
+        if self._coordinator_call("lease release", self.lease.release):
+            self.logger.info(f"Host lease released for {MOONLIGHT_HOST}")
+        # Skipped while the coordinator is down; the lease then expires after LEASE_TTL
+        self.lease.held = False
+            
+    def _publish_host_awake(self):
+        """Tell other units the gaming PC is up so they can skip their boot wait"""
+        self.host_awake_at = time.time()
+        if self.coordinator_registered:
+            self._queue_coordinator_call("host-awake broadcast", self.coordinator.publish_host_awake, UNIT_ID, MOONLIGHT_HOST)
+            
+    def _poll_coordinator_events(self):
+        """Pick up host-awake events published by other units"""
+        if not self.coordinator_registered:
+            return
+            
+        result = self._coordinator_call("event poll", self.coordinator.events_since, self.event_seq)
+        if result is not None and result.get("event_seq", 0) < self.event_seq:
+            # The coordinator restarted and numbers events from scratch again
+            self.event_seq = 0
+            result = self._coordinator_call("event poll", self.coordinator.events_since, self.event_seq)
+        if result is None:
+            return
+            
+        for event in result.get("events", []):
+            if (event.get("type") == EVENT_HOST_AWAKE and event.get("host") == MOONLIGHT_HOST
+                    and event.get("unit_id") != UNIT_ID):
+                # Local receive time: the coordinator's clock may differ from ours
+                self.host_awake_at = time.time()
+                self.logger.debug(f"Unit '{event.get('unit_id')}' reports {MOONLIGHT_HOST} awake")
+        self.event_seq = result.get("event_seq", self.event_seq)
+        
+    def _host_recently_awake(self) -> bool:
+        """Check whether this or another unit saw the host awake within HOST_AWAKE_WINDOW"""
+        return self.host_awake_at is not None and time.time() - self.host_awake_at < HOST_AWAKE_WINDOW
+        
     def _start_monitoring(self):
         """Start background monitoring threads"""
         # Health monitoring thread
@@ -162,6 +605,16 @@ class ButtonHandler:
         self.process_monitor_thread.start()
         self.logger.info("Process monitoring thread started")
         
+        # Fleet coordinator thread
+        if self.coordinator:
+            self.coordinator_thread = threading.Thread(
+                target=self._coordinator_worker,
+                name="Coordinator",
+                daemon=True
+            )
+            self.coordinator_thread.start()
+            self.logger.info("Fleet coordinator thread started")
+        
     def _health_monitor(self):
         """Background thread for health monitoring"""
         while not self.shutdown_event.is_set():
@@ -177,6 +630,7 @@ class ButtonHandler:
         while not self.shutdown_event.is_set():
             try:
                 self._check_process_state()
+                self._refresh_performance_profile()
                 self.shutdown_event.wait(PROCESS_CHECK_INTERVAL)
             except Exception as e:
                 self.logger.error(f"Process monitor error: {e}")
@@ -198,6 +652,11 @@ class ButtonHandler:
         # Validate current state
         self._validate_current_state()
         
+        # Heartbeat to the fleet coordinator (registration is retried by the coordinator thread)
+        if self.coordinator:
+            self._maintain_host_lease()
+            self._report_to_coordinator()
+        
     def _check_pid_file_health(self):
         """Check PID file for stale or invalid entries"""
         if not os.path.exists(PID_FILE):
@@ -255,12 +714,18 @@ class ButtonHandler:
             # Quick ping test
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
                 sock.settimeout(CONNECTION_TIMEOUT)
+                start_time = time.time()
                 result = sock.connect_ex((MOONLIGHT_HOST, 47989))  # Sunshine default port
                 
                 if result == 0:
+                    self.metrics["network_rtt_ms"] = round((time.time() - start_time) * 1000, 1)
                     self.logger.debug(f"Network connectivity to {MOONLIGHT_HOST} OK")
+                    if self.host_reachable is False:
+                        self._publish_host_awake()
+                    self.host_reachable = True
                 else:
                     self.logger.warning(f"Cannot connect to {MOONLIGHT_HOST}:47989")
+                    self.host_reachable = False
                     
         except Exception as e:
             self.logger.warning(f"Network connectivity check failed: {e}")
@@ -301,6 +766,8 @@ class ButtonHandler:
             self.logger.warning("State mismatch: IDLE but process found. Correcting to RUNNING.")
             self._set_state(StreamState.RUNNING)
             self._set_led_state()
+            if not self._acquire_host_lease(reclaim=True):
+                self.logger.error("Could not lease host for the running session, retrying on next health check")
             
     def _check_process_state(self):
         """Monitor process state changes"""
@@ -384,6 +851,20 @@ class ButtonHandler:
             self._state_change_time = datetime.now()
             self.logger.info(f"State changed: {old_state.value} → {new_state.value}")
             
+            if new_state == StreamState.RUNNING:
+                self.moonlight_pid, self.moonlight_start_ticks = self._read_moonlight_pid()
+                self.session_started_at = time.time()
+                self._apply_performance_profile()
+            elif new_state in [StreamState.IDLE, StreamState.ERROR]:
+                self.moonlight_pid = self.moonlight_start_ticks = self.session_started_at = None
+            if old_state == StreamState.RUNNING:
+                self._revert_performance_profile()
+            self._journal_state()
+            
+            if new_state in [StreamState.IDLE, StreamState.ERROR]:
+                self._release_host_lease()
+            self._report_to_coordinator()
+            
     def _set_led_state(self):
         """Set LED based on current state"""
         try:
@@ -436,22 +917,31 @@ class ButtonHandler:
     def _start_stream(self):
         """Enhanced stream start with comprehensive error handling"""
         self.logger.info("=== Starting Stream Sequence ===")
+        
+        # Make sure no other unit is streaming from (or waking) the same PC
+        if not self._acquire_host_lease():
+            self.logger.error("Gaming PC is in use by another unit. Not starting stream.")
+            self._set_state(StreamState.ERROR)
+            self._set_led_state()
+            return
+            
         self._set_state(StreamState.STARTING)
         self._set_led_state()
+        start_time = time.time()
         
         try:
             # Pre-flight checks
             self._perform_preflight_checks()
             
+            # The fleet recently saw the PC awake: keep probing, but poll the boot wait faster
+            env = os.environ.copy()
+            if self._host_recently_awake():
+                self.logger.info(f"{MOONLIGHT_HOST} was reported awake recently, shortening boot wait polling")
+                env["HOST_AWAKE"] = "true"
+            
             # Execute start script
             self.logger.info("Executing launch script...")
-            result = subprocess.run(
-                ["./launch-game.sh", "start"],
-                capture_output=True,
-                text=True,
-                timeout=180,  # 3 minute timeout
-                cwd=os.path.dirname(os.path.abspath(__file__))
-            )
+            result = self._run_launch_script("start", timeout=180, env=env)  # 3 minute timeout
             
             if result.returncode == 0:
                 self.logger.info("Launch script completed successfully")
@@ -459,8 +949,10 @@ class ButtonHandler:
                 
                 # Wait for process to appear
                 if self._wait_for_process_start():
-                    self._set_state(StreamState.RUNNING)
+                    self.metrics["start_latency_s"] = round(time.time() - start_time, 1)
                     self.restart_attempts = 0  # Reset counter on success
+                    self._set_state(StreamState.RUNNING)
+                    self._publish_host_awake()
                     self.logger.info("=== Stream Started Successfully ===")
                 else:
                     raise Exception("Process did not start within expected time")
@@ -487,17 +979,12 @@ class ButtonHandler:
         self.logger.info("=== Stopping Stream Sequence ===")
         self._set_state(StreamState.STOPPING)
         self._set_led_state()
+        start_time = time.time()
         
         try:
             # Execute stop script
             self.logger.info("Executing stop script...")
-            result = subprocess.run(
-                ["./launch-game.sh", "stop"],
-                capture_output=True,
-                text=True,
-                timeout=60,  # 1 minute timeout
-                cwd=os.path.dirname(os.path.abspath(__file__))
-            )
+            result = self._run_launch_script("stop", timeout=60)  # 1 minute timeout
             
             if result.returncode == 0:
                 self.logger.info("Stop script completed successfully")
@@ -512,6 +999,7 @@ class ButtonHandler:
             
             # Wait for process to stop
             if self._wait_for_process_stop():
+                self.metrics["stop_latency_s"] = round(time.time() - start_time, 1)
                 self._set_state(StreamState.IDLE)
                 self.logger.info("=== Stream Stopped Successfully ===")
             else:
@@ -585,6 +1073,53 @@ class ButtonHandler:
         self.logger.warning(f"Process did not stop within {timeout}s")
         return False
         
+    def _run_launch_script(self, command: str, timeout: float, env: Optional[Dict[str, str]] = None) -> subprocess.CompletedProcess:
+        """Run launch-game.sh in its own process group so a service stop can end it with its children"""
+        process = subprocess.Popen(
+            ["./launch-game.sh", command],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env,
+            start_new_session=True
+        )
+        self.launch_process = process
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._kill_launch_script(process)
+            raise
+        finally:
+            self.launch_process = None
+        return subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr)
+        
+    def _kill_launch_script(self, process: subprocess.Popen):
+        """Terminate a launch script and everything it started (Moonlight included)"""
+        self.logger.warning(f"Killing launch script (PID: {process.pid}) and its children")
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+            
+    def _abort_transition(self):
+        """End a half-finished start or stop because the service is stopping"""
+        state = self.current_state
+        process = self.launch_process
+        if process is not None and process.poll() is None:
+            try:
+                # A stop that is under way may finish (TV off, clean Moonlight exit); a start may not
+                process.wait(timeout=30 if state == StreamState.STOPPING else 0)
+            except subprocess.TimeoutExpired:
+                self._kill_launch_script(process)
+                
+        self._force_cleanup()
+        self._set_state(StreamState.IDLE)
+        self._set_led_state()
+        
     def _force_cleanup(self):
         """Force cleanup of any remaining processes and files"""
         self.logger.debug("Performing force cleanup...")
@@ -616,6 +1151,8 @@ class ButtonHandler:
             self._set_state(StreamState.ERROR)
             self.restart_attempts = 0  # Reset for next manual attempt
             
+        self._journal_state()
+            
     def run(self):
         """Main run loop"""
         self.logger.info("Button handler ready. Press button to control stream.")
@@ -629,10 +1166,16 @@ class ButtonHandler:
             
     def shutdown(self):
         """Graceful shutdown"""
+        # Runs from the signal handler and again from main()'s finally; only the first call counts
+        if self.shutdown_event.is_set():
+            return
+        self.shutdown_event.set()
         self.logger.info("Initiating graceful shutdown...")
         
-        # Signal threads to stop
-        self.shutdown_event.set()
+        # Hand the gaming PC back to the fleet unless a stream outlives us
+        # (the lease then expires after LEASE_TTL or is re-acquired on restart)
+        if self.current_state != StreamState.RUNNING:
+            self._release_host_lease()
         
         # Turn off LED
         if self.led:
@@ -650,6 +1193,15 @@ class ButtonHandler:
             self.logger.debug("Waiting for process monitor thread...")
             self.process_monitor_thread.join(timeout=5)
             
+        # Let the coordinator thread send what is already queued (e.g. the final IDLE report)
+        if self.coordinator_thread and self.coordinator_thread.is_alive():
+            self.logger.debug("Waiting for coordinator thread...")
+            try:
+                self.coordinator_queue.put(None, timeout=1)
+            except queue.Full:
+                pass
+            self.coordinator_thread.join(timeout=5)
+            
         # Clean up GPIO
         if self.button:
             try:
@@ -663,6 +1215,17 @@ class ButtonHandler:
             except Exception as e:
                 self.logger.error(f"Error closing LED: {e}")
                 
+        # Put governor and priorities back; a restart re-applies them to an adopted stream
+        self._revert_performance_profile()
+        self._journal_state()
+        
+        # Persist the final state so a restart can re-adopt a running stream
+        if self.journal:
+            try:
+                self.journal.close()
+            except Exception as e:
+                self.logger.error(f"Error closing state journal: {e}")
+                
         self.logger.info("=== Button Handler Shutdown Complete ===")
         
 class CustomFormatter(logging.Formatter):
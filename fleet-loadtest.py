@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Load test for the Galaxy fleet coordinator.
+
+Simulates many units walking the ButtonHandler state machine
+(StreamState IDLE → STARTING → RUNNING → STOPPING → IDLE) with the handler's
+HostLease acquire/maintain/release cycle against a shared set of hosts, and
+checks that no two units ever hold the same host at once.
+
+With --restart-at the coordinator is replaced by a fresh one mid-test (all
+leases dropped) and every unit streaming at that moment must reclaim its lease.
+
+Usage:
+    python3 fleet-loadtest.py --units 300 --hosts 4 --duration 10
+    python3 fleet-loadtest.py --http                     # in-process HTTP coordinator
+    python3 fleet-loadtest.py --url http://pi-hub:8470   # existing coordinator
+    python3 fleet-loadtest.py --http --restart-at 4      # coordinator restart, lease recovery
+"""
+import sys
+import time
+import random
+import argparse
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from fleet_coordinator import (
+    LocalCoordinator, CoordinatorClient, CoordinatorError, HostLease, EVENT_HOST_AWAKE, serve,
+)
+from stream_state import StreamState
+
+class FleetStats:
+    """Thread-safe counters, latency samples and lease ownership tracking"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+        self.holders: Dict[str, str] = {}
+        self.violations = 0
+        self.pending_reclaims: Set[Tuple[str, str]] = set()  # (host, unit) running at a coordinator restart
+
+    def record(self, op: str, seconds: float):
+        with self.lock:
+            self.latencies.setdefault(op, []).append(seconds)
+
+    def count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def claim(self, host: str, unit_id: str):
+        with self.lock:
+            holder = self.holders.get(host)
+            if holder is not None and holder != unit_id:
+                self.violations += 1
+            self.holders[host] = unit_id
+
+    def unclaim(self, host: str, unit_id: str):
+        with self.lock:
+            if self.holders.get(host) == unit_id:
+                del self.holders[host]
+            # Session ended before its next heartbeat; nothing left to reclaim
+            self.pending_reclaims.discard((host, unit_id))
+
+    def coordinator_restarted(self):
+        with self.lock:
+            self.pending_reclaims.update(self.holders.items())
+
+    def heartbeat(self, host: str, unit_id: str, held: bool):
+        with self.lock:
+            if (host, unit_id) not in self.pending_reclaims:
+                return
+            self.pending_reclaims.discard((host, unit_id))
+            name = "leases_reclaimed" if held else "leases_lost"
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+class RestartableCoordinator:
+    """In-process coordinator that can be swapped for a fresh one, like a coordinator restart"""
+
+    def __init__(self, target: LocalCoordinator):
+        self.target = target
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of pre-sorted samples"""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(pct / 100.0 * len(samples))) - 1))
+    return samples[index]
+
+def simulate_unit(coordinator, unit_id: str, hosts: List[str], stats: FleetStats,
+                  stop_event: threading.Event, session_time: float, renew_interval: float):
+    """One simulated unit: lease a host, stream for a while with heartbeats, release, repeat"""
+
+    def timed(op, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        except CoordinatorError:
+            stats.count("errors")
+            return None
+        finally:
+            stats.record(op, time.perf_counter() - start)
+
+    def report(state: StreamState, metrics: Optional[Dict[str, float]] = None):
+        timed("report", coordinator.report, unit_id, state.value, metrics or {})
+
+    rng = random.Random(unit_id)
+    home_host = rng.choice(hosts)
+    lease = HostLease(coordinator, unit_id, home_host)
+    registered = timed("register", coordinator.register, unit_id, {"host": home_host})
+    event_seq = registered["event_seq"] if registered else 0
+    report(StreamState.IDLE)
+
+    while not stop_event.is_set():
+        # Idle: poll host-awake events the way the process monitor does
+        events = timed("events", coordinator.events_since, event_seq)
+        if events:
+            if events["event_seq"] < event_seq:
+                event_seq = 0  # coordinator restarted; its sequence starts over
+            else:
+                event_seq = events["event_seq"]
+                awake = sum(1 for e in events["events"] if e["type"] == EVENT_HOST_AWAKE and e["host"] == home_host)
+                stats.count("awake_events_seen", awake)
+
+        # Same acquire → STARTING → RUNNING sequence as ButtonHandler._start_stream
+        if not timed("acquire", lease.acquire):
+            stats.count("lease_reclaim_wait" if lease.holder is None else "lease_denied")
+            stop_event.wait(rng.uniform(0.05, 0.2))
+            continue
+
+        stats.count("lease_granted")
+        stats.claim(home_host, unit_id)
+        report(StreamState.STARTING)
+        timed("publish", coordinator.publish_host_awake, unit_id, home_host)
+        report(StreamState.RUNNING, {"start_latency_s": rng.uniform(1, 40)})
+
+        # RUNNING: health-check heartbeats keep (or reclaim) the lease
+        session_end = time.monotonic() + rng.uniform(0.5, 1.5) * session_time
+        while not stop_event.is_set():
+            remaining = session_end - time.monotonic()
+            if remaining <= 0:
+                break
+            stop_event.wait(min(renew_interval, remaining))
+            held = timed("maintain", lease.maintain)
+            if held is None:
+                continue
+            stats.heartbeat(home_host, unit_id, held)
+            if not held:
+                # Another unit holds our host; the handler logs this and keeps streaming
+                break
+            report(StreamState.RUNNING)
+
+        report(StreamState.STOPPING)
+        stats.unclaim(home_host, unit_id)
+        timed("release", lease.release)
+        report(StreamState.IDLE)
+        stats.count("sessions")
+        stop_event.wait(rng.uniform(0.05, 0.2))
+
+def main():
+    parser = argparse.ArgumentParser(description="Galaxy fleet coordinator load test")
+    parser.add_argument("--units", type=int, default=200, help="Simulated units (default: 200)")
+    parser.add_argument("--hosts", type=int, default=4, help="Shared gaming PCs (default: 4)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Test duration in seconds (default: 10)")
+    parser.add_argument("--session-time", type=float, default=0.2, help="Mean simulated session length in seconds")
+    parser.add_argument("--renew-interval", type=float, default=0.05,
+                        help="Seconds between lease heartbeats while running (default: 0.05)")
+    parser.add_argument("--restart-at", type=float,
+                        help="Restart the coordinator this many seconds into the test (not with --url)")
+    parser.add_argument("--reclaim-grace", type=float, default=0.5,
+                        help="Reclaim grace of the restarted coordinator in seconds (default: 0.5)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Use an existing coordinator at this URL")
+    target.add_argument("--http", action="store_true", help="Start an in-process HTTP coordinator")
+    args = parser.parse_args()
+    if args.restart_at is not None and args.url:
+        parser.error("--restart-at needs an in-process coordinator")
+
+    # Fresh coordinators at test start have no leases to reclaim
+    server = None
+    if args.url:
+        coordinator = CoordinatorClient(args.url, timeout=5)
+    elif args.http:
+        server = serve("127.0.0.1", 0, LocalCoordinator(reclaim_grace=0))
+        threading.Thread(target=server.serve_forever, name="Coordinator", daemon=True).start()
+        coordinator = CoordinatorClient(f"http://127.0.0.1:{server.server_address[1]}", timeout=5)
+    else:
+        coordinator = RestartableCoordinator(LocalCoordinator(reclaim_grace=0))
+
+    hosts = [f"10.0.0.{i + 1}" for i in range(args.hosts)]
+    stats = FleetStats()
+    stop_event = threading.Event()
+    threads = [
+        threading.Thread(
+            target=simulate_unit,
+            args=(coordinator, f"unit-{i:04d}", hosts, stats, stop_event, args.session_time, args.renew_interval),
+            name=f"Unit-{i}",
+            daemon=True,
+        )
+        for i in range(args.units)
+    ]
+
+    print(f"Simulating {args.units} units on {args.hosts} hosts for {args.duration:.0f}s...")
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    if args.restart_at is not None and args.restart_at < args.duration:
+        time.sleep(args.restart_at)
+        restarted = LocalCoordinator(reclaim_grace=args.reclaim_grace)
+        if server:
+            server.RequestHandlerClass.coordinator = restarted
+        else:
+            coordinator.target = restarted
+        stats.coordinator_restarted()
+        print(f"Coordinator restarted at {time.perf_counter() - start:.1f}s "
+              f"({len(stats.pending_reclaims)} running sessions must reclaim their lease)")
+    time.sleep(max(0.0, args.duration - (time.perf_counter() - start)))
+    stop_event.set()
+    for thread in threads:
+        thread.join(timeout=10)
+    elapsed = time.perf_counter() - start
+
+    total_ops = sum(len(s) for s in stats.latencies.values())
+    print(f"\nCompleted {total_ops} coordinator calls in {elapsed:.1f}s ({total_ops / elapsed:.0f} ops/s)")
+    print(f"{'operation':<10} {'count':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for op, samples in sorted(stats.latencies.items()):
+        samples.sort()
+        print(f"{op:<10} {len(samples):>8} "
+              f"{percentile(samples, 50) * 1000:>9.2f} {percentile(samples, 95) * 1000:>9.2f} "
+              f"{percentile(samples, 99) * 1000:>9.2f} {samples[-1] * 1000:>9.2f}")
+
+    print("")
+    for name, value in sorted(stats.counters.items()):
+        print(f"{name:<20} {value}")
+    print(f"{'lease_violations':<20} {stats.violations}")
+    unrecovered = stats.counters.get("leases_lost", 0) + len(stats.pending_reclaims)
+    if args.restart_at is not None:
+        print(f"{'leases_unrecovered':<20} {unrecovered}")
+
+    snapshot = coordinator.snapshot()
+    print(f"{'units_registered':<20} {len(snapshot['units'])}")
+    print(f"{'leases_outstanding':<20} {len(snapshot['leases'])}")
+
+    if server:
+        server.shutdown()
+        server.server_close()
+
+    sys.exit(1 if stats.violations or unrecovered or stats.counters.get("errors") else 0)
+
+if __name__ == "__main__":
+    main()
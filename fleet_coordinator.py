@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Fleet coordinator for several Galaxy units sharing the same gaming PCs.
+
+Units register with the coordinator, report their StreamState and latency
+metrics, lease a host before starting a stream and broadcast "host is awake"
+events so other units can skip their Wake-on-LAN boot wait.
+
+Two implementations share one interface:
+- LocalCoordinator: in-process, thread-safe stand-in (tests, load tests)
+- CoordinatorClient: talks JSON over HTTP to `python3 fleet_coordinator.py`
+
+HostLease wraps the acquire/renew/release cycle a unit runs against either one.
+"""
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any, List
+
+DEFAULT_PORT = 8470
+DEFAULT_LEASE_TTL = 300  # seconds
+DEFAULT_UNIT_TTL = 120  # seconds without a report before a unit is considered gone
+DEFAULT_RECLAIM_GRACE = 60  # seconds after startup in which only running sessions may lease hosts
+MAX_EVENTS = 1000  # size of the event ring kept for polling units
+
+EVENT_HOST_AWAKE = "host_awake"
+
+class CoordinatorError(Exception):
+    """Raised when the coordinator cannot be reached or rejects a request"""
+
+class LocalCoordinator:
+    """In-process coordinator holding unit state, host leases and events"""
+
+    def __init__(self, lease_ttl: int = DEFAULT_LEASE_TTL, unit_ttl: int = DEFAULT_UNIT_TTL,
+                 reclaim_grace: float = DEFAULT_RECLAIM_GRACE):
+        self.lease_ttl = lease_ttl
+        self.unit_ttl = unit_ttl
+        # Leases only live in memory: after a restart, give units that are still streaming
+        # time to reclaim their host before anyone else may lease it
+        self.reclaim_until = time.time() + reclaim_grace
+        self._lock = threading.Lock()
+        self._units: Dict[str, Dict[str, Any]] = {}
+        self._leases: Dict[str, Dict[str, Any]] = {}
+        self._events: List[Dict[str, Any]] = []
+        self._event_seq = 0
+
+    def register(self, unit_id: str, info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Register (or re-register) a unit; returns the current event sequence"""
+        now = time.time()
+        with self._lock:
+            unit = self._get_unit(unit_id, now)
+            unit["info"] = dict(info or {})
+            unit["last_seen"] = now
+            return {"unit_id": unit_id, "event_seq": self._event_seq}
+
+    def report(self, unit_id: str, state: str, metrics: Optional[Dict[str, float]] = None) -> None:
+        """Record a unit's StreamState value and latest latency metrics"""
+        now = time.time()
+        with self._lock:
+            # Units pruned after a network outage come back on their next report
+            unit = self._get_unit(unit_id, now)
+            unit["state"] = state
+            unit["last_seen"] = now
+            if metrics:
+                unit["metrics"].update(metrics)
+
+    def acquire_lease(self, unit_id: str, host: str, ttl: Optional[int] = None,
+                      reclaim: bool = False) -> Dict[str, Any]:
+        """Try to lease a host; granted if free, expired or already held by this unit
+
+        `reclaim` marks a unit that is already streaming from the host; only those
+        are granted free hosts during the reclaim grace period after startup.
+        """
+        now = time.time()
+        ttl = ttl or self.lease_ttl
+        with self._lock:
+            lease = self._leases.get(host)
+            if lease and lease["unit_id"] != unit_id and lease["expires_at"] > now:
+                return {"granted": False, "holder": lease["unit_id"], "expires_at": lease["expires_at"]}
+            if not lease and not reclaim and now < self.reclaim_until:
+                return {"granted": False, "holder": None, "expires_at": self.reclaim_until}
+            self._leases[host] = {"unit_id": unit_id, "acquired_at": now, "expires_at": now + ttl}
+            return {"granted": True, "holder": unit_id, "expires_at": now + ttl}
+
+    def renew_lease(self, unit_id: str, host: str, ttl: Optional[int] = None) -> bool:
+        """Extend a held lease; False if the lease was lost in the meantime"""
+        now = time.time()
+        ttl = ttl or self.lease_ttl
+        with self._lock:
+            lease = self._leases.get(host)
+            if not lease or lease["unit_id"] != unit_id:
+                return False
+            lease["expires_at"] = now + ttl
+            return True
+
+    def release_lease(self, unit_id: str, host: str) -> bool:
+        """Release a lease held by this unit"""
+        with self._lock:
+            lease = self._leases.get(host)
+            if not lease or lease["unit_id"] != unit_id:
+                return False
+            del self._leases[host]
+            return True
+
+    def publish_host_awake(self, unit_id: str, host: str) -> int:
+        """Broadcast that a host answered on the Sunshine port; returns the event sequence"""
+        return self._publish(EVENT_HOST_AWAKE, unit_id, host)
+
+    def events_since(self, seq: int) -> Dict[str, Any]:
+        """Return events newer than `seq` and the latest sequence number"""
+        with self._lock:
+            events = [e for e in self._events if e["seq"] > seq]
+            return {"events": events, "event_seq": self._event_seq}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of fleet state with stale units and expired leases pruned"""
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            return {
+                "units": {uid: dict(u, metrics=dict(u["metrics"])) for uid, u in self._units.items()},
+                "leases": {host: dict(l) for host, l in self._leases.items()},
+                "event_seq": self._event_seq,
+            }
+
+    def _get_unit(self, unit_id: str, now: float) -> Dict[str, Any]:
+        return self._units.setdefault(unit_id, {
+            "unit_id": unit_id,
+            "state": "unknown",
+            "info": {},
+            "metrics": {},
+            "registered_at": now,
+            "last_seen": now,
+        })
+
+    def _publish(self, event_type: str, unit_id: str, host: str) -> int:
+        with self._lock:
+            self._event_seq += 1
+            self._events.append({
+                "seq": self._event_seq,
+                "type": event_type,
+                "unit_id": unit_id,
+                "host": host,
+                "timestamp": time.time(),
+            })
+            if len(self._events) > MAX_EVENTS:
+                del self._events[:len(self._events) - MAX_EVENTS]
+            return self._event_seq
+
+    def _prune(self, now: float) -> None:
+        for host in [h for h, l in self._leases.items() if l["expires_at"] <= now]:
+            del self._leases[host]
+        for unit_id in [u for u, d in self._units.items() if now - d["last_seen"] > self.unit_ttl]:
+            del self._units[unit_id]
+
+class HostLease:
+    """One unit's lease on one host: acquire before starting, maintain while running, release after
+
+    Works with LocalCoordinator and CoordinatorClient; coordinator errors propagate
+    as CoordinatorError so callers decide how to degrade.
+    """
+
+    def __init__(self, coordinator, unit_id: str, host: str, ttl: Optional[int] = None):
+        self.coordinator = coordinator
+        self.unit_id = unit_id
+        self.host = host
+        self.ttl = ttl
+        self.held = False
+        self.holder: Optional[str] = None  # unit holding the host after the last acquire
+
+    def acquire(self, reclaim: bool = False) -> bool:
+        """Lease the host; False if another unit holds it or the coordinator is still reclaiming"""
+        result = self.coordinator.acquire_lease(self.unit_id, self.host, self.ttl, reclaim)
+        self.held = bool(result.get("granted"))
+        self.holder = result.get("holder")
+        return self.held
+
+    def maintain(self) -> bool:
+        """Renew the lease of a running session, re-acquiring it if the coordinator lost it
+
+        A failed renewal usually means the coordinator restarted or the lease expired
+        while the unit was offline; the lease is only given up if another unit holds the host.
+        """
+        if self.held and self.coordinator.renew_lease(self.unit_id, self.host, self.ttl):
+            return True
+        return self.acquire(reclaim=True)
+
+    def release(self) -> bool:
+        """Release the lease if held"""
+        if not self.held:
+            return False
+        self.held = False
+        return self.coordinator.release_lease(self.unit_id, self.host)
+
+class CoordinatorClient:
+    """HTTP client for a remote coordinator, same interface as LocalCoordinator"""
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def register(self, unit_id: str, info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self._post("/register", {"unit_id": unit_id, "info": info or {}})
+
+    def report(self, unit_id: str, state: str, metrics: Optional[Dict[str, float]] = None) -> None:
+        self._post("/report", {"unit_id": unit_id, "state": state, "metrics": metrics or {}})
+
+    def acquire_lease(self, unit_id: str, host: str, ttl: Optional[int] = None,
+                      reclaim: bool = False) -> Dict[str, Any]:
+        return self._post("/lease/acquire", {"unit_id": unit_id, "host": host, "ttl": ttl, "reclaim": reclaim})
+
+    def renew_lease(self, unit_id: str, host: str, ttl: Optional[int] = None) -> bool:
+        return self._post("/lease/renew", {"unit_id": unit_id, "host": host, "ttl": ttl})["renewed"]
+
+    def release_lease(self, unit_id: str, host: str) -> bool:
+        return self._post("/lease/release", {"unit_id": unit_id, "host": host})["released"]
+
+    def publish_host_awake(self, unit_id: str, host: str) -> int:
+        return self._post("/events/host-awake", {"unit_id": unit_id, "host": host})["event_seq"]
+
+    def events_since(self, seq: int) -> Dict[str, Any]:
+        return self._request("GET", f"/events?since={int(seq)}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return self._request("GET", "/fleet")
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self._request("POST", path, payload)
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(
+            self.url + path,
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode("utf-8") or "{}")
+        except urllib.error.HTTPError as e:
+            raise CoordinatorError(f"{method} {path} failed: HTTP {e.code} {e.read().decode('utf-8', 'replace')}")
+        except (urllib.error.URLError, socket.timeout, OSError, ValueError) as e:
+            raise CoordinatorError(f"{method} {path} failed: {e}")
+
+class _CoordinatorRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints exposing a LocalCoordinator over HTTP"""
+
+    coordinator: LocalCoordinator = None  # set by serve()
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        try:
+            if parsed.path == "/events":
+                since = int(parse_qs(parsed.query).get("since", ["0"])[0])
+                self._reply(200, self.coordinator.events_since(since))
+            elif parsed.path == "/fleet":
+                self._reply(200, self.coordinator.snapshot())
+            else:
+                self._reply(404, {"error": f"Unknown path: {parsed.path}"})
+        except ValueError as e:
+            self._reply(400, {"error": f"Bad request: {e}"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+            if length < 0:
+                raise ValueError("negative Content-Length")
+            body = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+            if not isinstance(body, dict):
+                raise ValueError("body must be a JSON object")
+            unit_id = self._field(body, "unit_id", str)
+            c = self.coordinator
+
+            if self.path == "/register":
+                result = c.register(unit_id, self._field(body, "info", dict, {}))
+            elif self.path == "/report":
+                c.report(unit_id, self._field(body, "state", str), self._field(body, "metrics", dict, {}))
+                result = {}
+            elif self.path == "/lease/acquire":
+                result = c.acquire_lease(unit_id, self._field(body, "host", str), self._ttl(body),
+                                         bool(body.get("reclaim")))
+            elif self.path == "/lease/renew":
+                result = {"renewed": c.renew_lease(unit_id, self._field(body, "host", str), self._ttl(body))}
+            elif self.path == "/lease/release":
+                result = {"released": c.release_lease(unit_id, self._field(body, "host", str))}
+            elif self.path == "/events/host-awake":
+                result = {"event_seq": c.publish_host_awake(unit_id, self._field(body, "host", str))}
+            else:
+                self._reply(404, {"error": f"Unknown path: {self.path}"})
+                return
+            self._reply(200, result)
+
+        except (KeyError, ValueError, TypeError, UnicodeDecodeError) as e:
+            self._reply(400, {"error": f"Bad request: {e}"})
+
+    @staticmethod
+    def _field(body: Dict[str, Any], name: str, expected: type, default: Any = None) -> Any:
+        """Return a body field, raising ValueError if it is missing or of the wrong type"""
+        value = body.get(name)
+        if value is None:
+            if default is None:
+                raise ValueError(f"missing field '{name}'")
+            return default
+        if not isinstance(value, expected):
+            raise ValueError(f"field '{name}' must be {expected.__name__}")
+        return value
+
+    @staticmethod
+    def _ttl(body: Dict[str, Any]) -> Optional[int]:
+        ttl = body.get("ttl")
+        if ttl is not None and (isinstance(ttl, bool) or not isinstance(ttl, (int, float)) or ttl <= 0):
+            raise ValueError("field 'ttl' must be a positive number")
+        return ttl
+
+    def _reply(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Keep per-request noise out of stderr; the coordinator is polled often
+        pass
+
+def make_coordinator(url: str, timeout: float = 2.0):
+    """Return a coordinator for a URL: `local` gives an in-process stand-in"""
+    if url == "local":
+        # Starts together with the handler, so there are no leases to reclaim
+        return LocalCoordinator(reclaim_grace=0)
+    return CoordinatorClient(url, timeout=timeout)
+
+def serve(bind: str, port: int, coordinator: Optional[LocalCoordinator] = None) -> ThreadingHTTPServer:
+    """Create an HTTP server for a coordinator (call serve_forever() to run it)"""
+    handler_class = type("CoordinatorRequestHandler", (_CoordinatorRequestHandler,), {
+        "coordinator": coordinator or LocalCoordinator(),
+    })
+    server_class = type("CoordinatorServer", (ThreadingHTTPServer,), {
+        "daemon_threads": True,
+        "request_queue_size": 256,  # hundreds of units may poll at the same moment
+    })
+    return server_class((bind, port), handler_class)
+
+def main():
+    """Run a standalone coordinator"""
+    parser = argparse.ArgumentParser(description="Galaxy fleet coordinator")
+    parser.add_argument("--bind", default=os.getenv("COORDINATOR_BIND", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("COORDINATOR_PORT", str(DEFAULT_PORT))))
+    parser.add_argument("--lease-ttl", type=int, default=int(os.getenv("LEASE_TTL", str(DEFAULT_LEASE_TTL))))
+    parser.add_argument("--reclaim-grace", type=float,
+                        default=float(os.getenv("RECLAIM_GRACE", str(DEFAULT_RECLAIM_GRACE))),
+                        help="Seconds after startup reserved for running units to reclaim their leases "
+                             "(keep above the units' HEALTH_CHECK_INTERVAL)")
+    args = parser.parse_args()
+
+    server = serve(args.bind, args.port, LocalCoordinator(lease_ttl=args.lease_ttl, reclaim_grace=args.reclaim_grace))
+    print(f"Galaxy fleet coordinator listening on {args.bind}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down coordinator...")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -223,13 +223,17 @@ send_wake_on_lan() {
 wait_for_pc_boot() {
     local wait_time="$1"
     local check_interval=5
-    local max_checks=$((wait_time / check_interval))
+    local started=$SECONDS
+    local elapsed=0
     
-    log "INFO" "Waiting for PC to boot (up to ${wait_time}s with connectivity testing)..."
+    if [[ "${HOST_AWAKE:-false}" == "true" ]]; then
+        # Another unit saw the PC awake moments ago, so it should answer soon
+        check_interval=1
+    fi
     
-    for ((i=1; i<=max_checks; i++)); do
-        local elapsed=$((i * check_interval))
-        
+    log "INFO" "Waiting for PC to boot (up to ${wait_time}s, checking every ${check_interval}s)..."
+    
+    while ((elapsed < wait_time)); do
         # Test connectivity every check_interval seconds
         if test_network_connectivity "$MOONLIGHT_HOST" 3 1; then
             log "INFO" "PC is responsive after ${elapsed}s (ahead of schedule!)"
@@ -238,6 +242,7 @@ wait_for_pc_boot() {
         
         log "DEBUG" "Boot wait progress: ${elapsed}/${wait_time}s (PC not yet responsive)"
         sleep "$check_interval"
+        elapsed=$((SECONDS - started))
     done
     
     # Final connectivity test
@@ -675,6 +680,7 @@ ENVIRONMENT VARIABLES:
     
     Required: LOG_FILE, PID_FILE, PC_MAC, MOONLIGHT_HOST, MOONLIGHT_APP, TV_CEC_NAME
     Optional: BOOT_WAIT_TIME, CONNECTION_TIMEOUT, MAX_RETRIES, DEBUG, VERBOSE
+    Set by button-handler.py: HOST_AWAKE (poll the boot wait every second when another unit saw the PC awake)
 
 EXAMPLES:
     $SCRIPT_NAME start --verbose
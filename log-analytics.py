@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+"""
+Galaxy log analytics.
+
+Streams the whole log history (the live LOG_FILE plus rotated and
+gzip/bz2/xz-compressed copies) through a single-pass parser that understands
+both writers:
+- button-handler.py  (CustomFormatter): [dd.mm.YYYY HH:MM:SS.mmm] [LEVEL] [Thread] [ButtonHandler] msg
+- launch-game.sh     (log()):           [dd.mm.YYYY HH:MM:SS.mmm] [LEVEL] [PID] [LaunchGame] msg
+
+Per-file results are cached in a compact on-disk index keyed by file identity
+(inode, or a content fingerprint for compressed copies), so renamed rotations
+are not parsed again and the live file is resumed from its last offset.
+Sessions that straddle a rotation are continued in the next file. Reports start latency percentiles per phase, failure rates by cause,
+state flaps and the slowest sessions.
+
+Usage:
+    python3 log-analytics.py                       # LOG_FILE from .env and its rotations
+    python3 log-analytics.py --since 01.10.2026    # only sessions from this date on
+    python3 log-analytics.py --json > report.json
+    python3 log-analytics.py /var/log/galaxy/logs.log* --no-index
+"""
+import os
+import re
+import bz2
+import sys
+import copy
+import glob
+import gzip
+import json
+import lzma
+import hashlib
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+INDEX_VERSION = 3  # 3: entries keyed by file identity, sessions continue across files
+FLAP_WINDOW = 60  # seconds: A → B → A within this window counts as a flap
+READ_BUFFER = 1024 * 1024
+HEAD_BYTES = 64 * 1024  # Decompressed bytes hashed to fingerprint a file
+
+OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+# Message prefix → (event, argument). Looked up by the first KEY_LENGTH bytes
+# of the message so most lines cost a single dict probe.
+KEY_LENGTH = 10
+EVENTS = [
+    (b"=== Button Handler Starting ===", "restart", None),
+    (b"=== Starting Stream Sequence ===", "session", None),
+    (b"=== Starting Enhanced Launch Sequence", "script_session", None),
+    (b"=== Stream Started Successfully ===", "success", None),
+    (b"Start attempt ", "failure", None),
+    (b"=== Stopping Stream Sequence ===", "stop_begin", None),
+    (b"=== Stream Stopped Successfully ===", "stop_end", None),
+    (b"State changed: ", "state", None),
+    (b"State mismatch:", "mismatch", None),
+    (b"Executing launch script...", "mark", "script_begin"),
+    (b"Launch script completed successfully", "mark", "script_end"),
+    (b"Powering on TV via CEC", "mark", "tv_begin"),
+    (b"CEC command successful: on", "mark", "tv_end"),
+    (b"CEC command failed or timed out: on", "mark", "tv_end"),
+    (b"Sending Wake-on-LAN", "mark", "wol"),
+    (b"Waiting for PC to boot", "mark", "boot_begin"),
+    (b"PC is responsive after", "mark", "boot_end"),
+    (b"PC may not be fully ready", "mark", "boot_end"),
+    (b"Launching Moonlight stream", "mark", "moonlight_begin"),
+    (b"Moonlight process confirmed running", "mark", "moonlight_running"),
+    (b"Moonlight process appears to be running", "mark", "moonlight_ready"),
+]
+DISPATCH: Dict[bytes, List[Tuple[bytes, str, Optional[str]]]] = {}
+for _prefix, _event, _arg in EVENTS:
+    DISPATCH.setdefault(_prefix[:KEY_LENGTH], []).append((_prefix, _event, _arg))
+
+# Launch-script ERROR lines that elaborate on the previous error (advice, captured
+# output) rather than report a new one; they never become the failure cause
+ERROR_FOLLOW_UPS = (b"Check ", b"Install ", b"Moonlight error output:", b"  ")
+
+# Phase name → (begin mark, end mark)
+PHASES = [
+    ("tv_power", "tv_begin", "tv_end"),
+    ("wake_on_lan", "wol", "boot_begin"),
+    ("boot_wait", "boot_begin", "boot_end"),
+    ("moonlight_launch", "moonlight_begin", "moonlight_running"),
+    ("moonlight_ready", "moonlight_running", "moonlight_ready"),
+    ("launch_script", "script_begin", "script_end"),
+]
+
+_NUMBERS = re.compile(r"\d+")
+_day_cache: Dict[bytes, float] = {}
+
+def parse_timestamp(ts: bytes) -> Optional[float]:
+    """Parse "dd.mm.YYYY HH:MM:SS[.mmm]" (or ISO "YYYY-mm-dd ...") to epoch seconds.
+
+    Milliseconds are optional: busybox `date` has no %3N and writes garbage there.
+    """
+    day = ts[:10]
+    midnight = _day_cache.get(day)
+    if midnight is None:
+        try:
+            if day[2:3] == b".":
+                parsed = datetime(int(day[6:10]), int(day[3:5]), int(day[0:2]))
+            else:
+                parsed = datetime(int(day[0:4]), int(day[5:7]), int(day[8:10]))
+        except ValueError:
+            return None
+        midnight = _day_cache[day] = time.mktime(parsed.timetuple())
+    try:
+        seconds = int(ts[11:13]) * 3600 + int(ts[14:16]) * 60 + int(ts[17:19])
+    except ValueError:
+        return None
+    fraction = ts[20:23]
+    if fraction.isdigit():
+        seconds += int(fraction) / 1000.0
+    return midnight + seconds
+
+def flap_key(last: Optional[Tuple[str, str, float]], old: str, new: str, ts: float) -> Optional[str]:
+    """"new → old → new" if old → new undoes the `last` transition within FLAP_WINDOW"""
+    if last and last[0] == new and last[1] == old and ts - last[2] <= FLAP_WINDOW:
+        return f"{new} → {old} → {new}"
+    return None
+
+def normalize_cause(message: str) -> str:
+    """Collapse numbers and embedded log lines so equal failures group together"""
+    # Launch script stderr carries whole log lines; keep only the last message
+    if "] [" in message:
+        message = message.rsplit("] ", 1)[-1]
+    return _NUMBERS.sub("N", message.strip())[:100]
+
+class LogParser:
+    """Single-pass state machine turning log lines into session records"""
+
+    def __init__(self, carry: Optional[Dict[str, Any]] = None):
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.flaps: List[Tuple[float, str]] = []
+        self.mismatches: List[float] = []
+        self.lines = 0
+        self.current: Optional[Dict[str, Any]] = None
+        self.running_id: Optional[str] = None
+        self.last_transition: Optional[Tuple[str, str, float]] = None
+        self.first_transition: Optional[Tuple[str, str, float]] = None
+        if carry:
+            carry = copy.deepcopy(carry)  # Sessions are updated in place; leave the previous file's alone
+            self.current = carry.get("current")
+            self.running_id = carry.get("running_id")
+            last = carry.get("last_transition")
+            self.last_transition = tuple(last) if last else None
+            # The streaming session still waiting for its stop sequence
+            if carry.get("running"):
+                self.sessions[self.running_id] = carry["running"]
+
+    def carry(self) -> Dict[str, Any]:
+        """Parser state needed to resume parsing after the last consumed line"""
+        return {
+            "current": self.current,
+            "running_id": self.running_id,
+            "running": self.sessions.get(self.running_id) if self.running_id else None,
+            "last_transition": list(self.last_transition) if self.last_transition else None,
+        }
+
+    def feed(self, line: bytes):
+        self.lines += 1
+        if line[:1] != b"[":
+            return  # Moonlight output appended by launch-game.sh, tracebacks, ...
+
+        parts = line.split(b"] ", 4)
+        if len(parts) < 5:
+            return
+        message = parts[4]
+
+        candidates = DISPATCH.get(message[:KEY_LENGTH])
+        if candidates:
+            for prefix, event, arg in candidates:
+                if message.startswith(prefix):
+                    ts = parse_timestamp(parts[0][1:])
+                    if ts is not None:
+                        self._handle(event, arg, ts, message)
+                    return
+
+        # The last launch-script error before the failure is the fatal one; earlier
+        # errors (e.g. a missing cec-client) were survivable
+        if (self.current is not None
+                and parts[1] == b"[ERROR" and parts[3] == b"[LaunchGame"
+                and not message.startswith(ERROR_FOLLOW_UPS)):
+            self.current["error"] = message.decode("utf-8", "replace").strip()
+
+    def _handle(self, event: str, arg: Optional[str], ts: float, message: bytes):
+        current = self.current
+
+        if event == "mark":
+            if current is not None:
+                current["marks"].setdefault(arg, ts)
+                if arg == "script_end":
+                    # The script succeeded, so none of its errors caused a later failure
+                    current["error"] = None
+        elif event == "session":
+            self._open(ts)
+        elif event == "script_session":
+            # Launch script run by hand (no handler session around it)
+            if current is None:
+                self._open(ts)
+        elif event == "success":
+            if current is not None:
+                self.running_id = self._close("ok", ts)
+        elif event == "failure":
+            if current is not None:
+                text = message.decode("utf-8", "replace")
+                cause = current.get("error") or text.split("failed: ", 1)[-1]
+                self._close("failed", ts, normalize_cause(cause))
+        elif event == "restart":
+            if current is not None:
+                self._close("interrupted", ts)
+            self.running_id = None
+        elif event == "stop_begin":
+            session = self.sessions.get(self.running_id) if self.running_id else None
+            if session is not None:
+                session["stop_begin"] = ts
+                session["streamed"] = round(ts - session["end"], 3)
+        elif event == "stop_end":
+            session = self.sessions.get(self.running_id) if self.running_id else None
+            if session is not None and "stop_begin" in session:
+                session["phases"]["stop"] = round(ts - session.pop("stop_begin"), 3)
+            self.running_id = None
+        elif event == "state":
+            self._transition(ts, message.decode("utf-8", "replace"))
+        elif event == "mismatch":
+            self.mismatches.append(ts)
+
+    def _open(self, ts: float):
+        if self.current is not None:
+            self._close("interrupted", ts)
+        self.current = {"start": ts, "marks": {}, "error": None}
+
+    def _close(self, outcome: str, ts: float, cause: Optional[str] = None) -> str:
+        current = self.current
+        self.current = None
+        marks = current["marks"]
+
+        phases = {}
+        for name, begin, end in PHASES:
+            if begin in marks and end in marks and marks[end] >= marks[begin]:
+                phases[name] = round(marks[end] - marks[begin], 3)
+        if outcome == "ok":
+            phases["total"] = round(ts - current["start"], 3)
+
+        session_id = datetime.fromtimestamp(current["start"]).strftime("%Y%m%d-%H%M%S")
+        while session_id in self.sessions:
+            session_id += "+"
+        self.sessions[session_id] = {
+            "start": current["start"],
+            "end": ts,
+            "outcome": outcome,
+            "cold": "wol" in marks,
+            "cause": cause,
+            "phases": phases,
+        }
+        return session_id
+
+    def _transition(self, ts: float, message: str):
+        # "State changed: idle → starting"
+        states = message[len("State changed: "):].strip().split(" → ")
+        if len(states) != 2:
+            return
+        old, new = states
+        key = flap_key(self.last_transition, old, new, ts)
+        if key:
+            self.flaps.append((ts, key))
+        if self.first_transition is None:
+            self.first_transition = (old, new, ts)
+        self.last_transition = (old, new, ts)
+
+def open_log(path: str):
+    opener = OPENERS.get(os.path.splitext(path)[1])
+    if opener:
+        return opener(path, "rb")
+    return open(path, "rb", buffering=READ_BUFFER)
+
+def is_compressed(path: str) -> bool:
+    return os.path.splitext(path)[1] in OPENERS
+
+def file_signature(path: str) -> List[int]:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def head_digest(path: str, length: int = HEAD_BYTES) -> str:
+    """Hash of the first `length` (decompressed) bytes of a log file"""
+    with open_log(path) as f:
+        return hashlib.blake2b(f.read(length), digest_size=16).hexdigest()
+
+def file_key(path: str) -> str:
+    """Index key that stays the same when logrotate renames the file"""
+    st = os.stat(path)
+    if is_compressed(path):
+        # Compression writes a new file (and copies get new inodes); the content identifies it
+        return f"content:{st.st_size}:{head_digest(path)}"
+    return f"inode:{st.st_dev}:{st.st_ino}"
+
+def handover(entry: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Sessions a file leaves open for the next one to continue, None if there are none"""
+    if entry is None:
+        return None
+    carry = entry["carry"]
+    if carry["current"] is None and carry["running"] is None:
+        return None
+    # Flaps across files are matched in analyze() instead
+    return dict(carry, last_transition=None)
+
+def parse_file(path: str, offset: int = 0, carry: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Parse one log file (from `offset` for a resumed live file) into an index entry.
+
+    `carry` is the parser state to continue from: the file's own for a resumed parse,
+    otherwise what the previous file handed over.
+    """
+    signature = file_signature(path)
+    parser = LogParser(carry)
+    consumed = offset
+
+    with open_log(path) as f:
+        if offset:
+            f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # Partial last line still being written; pick it up next time
+            consumed += len(line)
+            parser.feed(line)
+
+    # Tells a resumable file from another one that got its inode after it was deleted
+    head = None if is_compressed(path) else [min(consumed, HEAD_BYTES), head_digest(path, min(consumed, HEAD_BYTES))]
+    return {
+        "signature": signature,
+        "head": head,
+        "offset": consumed,
+        "lines": parser.lines,
+        "sessions": parser.sessions,
+        "flaps": parser.flaps,
+        "mismatches": parser.mismatches,
+        "first_transition": list(parser.first_transition) if parser.first_transition else None,
+        "carry_in": carry,
+        "carry": parser.carry(),
+    }
+
+def merge_entry(previous: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine a cached index entry with the results of resuming the same file"""
+    sessions = dict(previous["sessions"])
+    sessions.update(update["sessions"])
+    return dict(update,
+                head=previous["head"],
+                lines=previous["lines"] + update["lines"],
+                sessions=sessions,
+                flaps=previous["flaps"] + update["flaps"],
+                mismatches=previous["mismatches"] + update["mismatches"],
+                first_transition=previous["first_transition"] or update["first_transition"],
+                carry_in=previous["carry_in"])
+
+def first_timestamp(path: str) -> Optional[float]:
+    """Timestamp of the first log line; None for files without one"""
+    with open_log(path) as f:
+        for line in f:
+            if line[:1] == b"[":
+                ts = parse_timestamp(line[1:24])
+                if ts is not None:
+                    return ts
+    return None
+
+def discover_logs(paths: List[str], expand_rotations: bool) -> List[str]:
+    """Resolve paths/globs (and LOG_FILE's rotated copies) to log files, oldest first"""
+    found = set()
+    for path in paths:
+        if expand_rotations:
+            # logs.log, logs.log.1, logs.log.2.gz, logs.log-20261001.xz, ...
+            matches = glob.glob(glob.escape(path) + "*")
+        elif os.path.exists(path):
+            matches = [path]
+        else:
+            matches = glob.glob(path)
+        for match in matches:
+            if os.path.isfile(match) and not match.endswith((".index.json", ".tmp")):
+                found.add(match)
+    # Sessions continue from one file into the next, so the order matters. mtimes don't
+    # give it: compressing a rotated file (and copying one) writes a new mtime.
+    return sorted(found, key=lambda p: (first_timestamp(p) or os.stat(p).st_mtime, p))
+
+def load_index(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r") as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION:
+            return index
+    except (OSError, ValueError):
+        pass
+    return {"version": INDEX_VERSION, "files": {}}
+
+def save_index(path: str, index: Dict[str, Any]):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(temp_path, path)
+
+def plan_parse(path: str, cached: Optional[Dict[str, Any]]):
+    """Decide how to bring a file's index entry up to date: reuse, resume or full parse"""
+    if cached is None:
+        return "parse", 0, None
+    if is_compressed(path):
+        # Keyed by content, so this is the same file (possibly under a new name)
+        return "reuse", 0, None
+    signature = file_signature(path)
+    if cached["signature"] == signature:
+        return "reuse", 0, None
+    length, digest = cached["head"]
+    if signature[0] >= cached["offset"] and head_digest(path, length) == digest:
+        return "resume", cached["offset"], cached["carry"]
+    # Truncated (copytruncate) or a different file on a reused inode
+    return "parse", 0, None
+
+def build(log_files: List[str], index_path: Optional[str], jobs: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Bring the index up to date for all files; returns (index, stats)"""
+    index = load_index(index_path) if index_path else {"version": INDEX_VERSION, "files": {}}
+    cached_files = index["files"]
+    keys = {path: file_key(path) for path in log_files}
+
+    actions = {}
+    work = []
+    for path in log_files:
+        action, offset, carry = plan_parse(path, cached_files.get(keys[path]))
+        actions[path] = action
+        if action != "reuse":
+            work.append((path, offset, carry))
+
+    start_time = time.perf_counter()
+    if len(work) > 1 and jobs > 1:
+        # New files are parsed independently and in parallel, as if no session was open at their start
+        with ProcessPoolExecutor(max_workers=min(jobs, len(work))) as pool:
+            results = list(pool.map(parse_file, *zip(*work)))
+    else:
+        results = [parse_file(p, o, c) for p, o, c in work]
+
+    entries = {path: cached_files[keys[path]] for path in log_files if actions[path] == "reuse"}
+    for (path, _, _), result in zip(work, results):
+        entries[path] = merge_entry(cached_files[keys[path]], result) if actions[path] == "resume" else result
+
+    # A file that starts inside a session the previous one left open (a stream running
+    # at rotation time) is parsed again, continuing that session. Oldest first, so the
+    # continued copy of a session replaces the earlier one in analyze().
+    files = {}
+    previous = None
+    for path in log_files:
+        entry = entries[path]
+        carry = handover(previous)
+        if entry["carry_in"] != carry:
+            entry = parse_file(path, 0, carry)
+            actions[path] = "parse"
+        # Forgets files that were rotated away for good
+        files[keys[path]] = previous = entry
+    index["files"] = files
+
+    stats = {"files": len(log_files), "lines": 0, "bytes": sum(os.path.getsize(p) for p in log_files),
+             "parse_seconds": time.perf_counter() - start_time}
+    for name, action in [("reused", "reuse"), ("resumed", "resume"), ("parsed", "parse")]:
+        stats[name] = sum(1 for a in actions.values() if a == action)
+    stats["lines"] = sum(entry["lines"] for entry in index["files"].values())
+    if index_path:
+        save_index(index_path, index)
+    return index, stats
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of pre-sorted samples"""
+    if not samples:
+        return 0.0
+    rank = min(len(samples) - 1, max(0, int(round(pct / 100.0 * len(samples))) - 1))
+    return samples[rank]
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "p50": percentile(samples, 50),
+        "p90": percentile(samples, 90),
+        "p99": percentile(samples, 99),
+        "max": samples[-1] if samples else 0.0,
+    }
+
+def analyze(index: Dict[str, Any], since: Optional[float], top: int) -> Dict[str, Any]:
+    """Aggregate per-file index entries into the report"""
+    sessions: Dict[str, Dict[str, Any]] = {}
+    flaps: Dict[str, int] = {}
+    mismatches = 0
+    last_transition = None
+    for entry in index["files"].values():
+        # The parser of each file starts without the previous file's last transition
+        first = entry["first_transition"]
+        key = flap_key(last_transition, *first) if first else None
+        if key and (since is None or first[2] >= since):
+            flaps[key] = flaps.get(key, 0) + 1
+        last_transition = entry["carry"]["last_transition"] or last_transition
+
+        for session_id, session in entry["sessions"].items():
+            if since is None or session["start"] >= since:
+                sessions[session_id] = session
+        for ts, key in entry["flaps"]:
+            if since is None or ts >= since:
+                flaps[key] = flaps.get(key, 0) + 1
+        mismatches += sum(1 for ts in entry["mismatches"] if since is None or ts >= since)
+
+    outcomes: Dict[str, int] = {}
+    causes: Dict[str, int] = {}
+    phase_samples: Dict[str, List[float]] = {}
+    for session in sessions.values():
+        outcomes[session["outcome"]] = outcomes.get(session["outcome"], 0) + 1
+        if session["cause"]:
+            causes[session["cause"]] = causes.get(session["cause"], 0) + 1
+        for phase, seconds in session["phases"].items():
+            if phase == "total":
+                phase = "total_cold" if session["cold"] else "total_warm"
+            phase_samples.setdefault(phase, []).append(seconds)
+
+    phase_order = ["total_cold", "total_warm"] + [name for name, _, _ in PHASES] + ["stop"]
+    total = len(sessions)
+    slowest = sorted(
+        ((sid, s) for sid, s in sessions.items() if "total" in s["phases"]),
+        key=lambda item: item[1]["phases"]["total"],
+        reverse=True,
+    )[:top]
+
+    return {
+        "sessions": total,
+        "outcomes": outcomes,
+        "cold_starts": sum(1 for s in sessions.values() if s["cold"]),
+        "phases": {p: summarize(phase_samples[p]) for p in phase_order if p in phase_samples},
+        "failures": [
+            {"cause": cause, "count": count, "rate": count / total if total else 0.0}
+            for cause, count in sorted(causes.items(), key=lambda item: -item[1])
+        ],
+        "flaps": dict(sorted(flaps.items(), key=lambda item: -item[1])),
+        "state_mismatches": mismatches,
+        "slowest": [dict(session, id=sid) for sid, session in slowest],
+    }
+
+def print_report(report: Dict[str, Any], stats: Dict[str, Any], elapsed: float):
+    print(f"Galaxy log analytics: {stats['files']} files, {stats['bytes'] / 1e6:.1f} MB, {stats['lines']} lines "
+          f"({stats['parsed']} parsed, {stats['resumed']} resumed, {stats['reused']} from index) "
+          f"in {elapsed:.2f}s")
+
+    outcomes = report["outcomes"]
+    print(f"\nSessions: {report['sessions']} "
+          f"(ok {outcomes.get('ok', 0)}, failed {outcomes.get('failed', 0)}, "
+          f"interrupted {outcomes.get('interrupted', 0)}), cold starts: {report['cold_starts']}")
+
+    if report["phases"]:
+        print("\nStart latency by phase (seconds)")
+        print(f"  {'phase':<18} {'count':>7} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+        for phase, s in report["phases"].items():
+            print(f"  {phase:<18} {s['count']:>7} {s['p50']:>8.1f} {s['p90']:>8.1f} {s['p99']:>8.1f} {s['max']:>8.1f}")
+
+    if report["failures"]:
+        print("\nFailures by cause")
+        for failure in report["failures"]:
+            print(f"  {failure['count']:>6} {failure['rate'] * 100:>6.1f}%  {failure['cause']}")
+
+    print(f"\nState flaps (A → B → A within {FLAP_WINDOW}s): {sum(report['flaps'].values())}")
+    for key, count in report["flaps"].items():
+        print(f"  {count:>6}  {key}")
+    print(f"State mismatches corrected by health checks: {report['state_mismatches']}")
+
+    if report["slowest"]:
+        print("\nSlowest sessions")
+        for session in report["slowest"]:
+            phases = {k: v for k, v in session["phases"].items() if k not in ["total", "stop"]}
+            worst = max(phases.items(), key=lambda item: item[1]) if phases else ("-", 0.0)
+            print(f"  {session['id']}  {session['phases']['total']:>7.1f}s  "
+                  f"{'cold' if session['cold'] else 'warm'}  slowest phase: {worst[0]} ({worst[1]:.1f}s)")
+
+def parse_date(value: str) -> float:
+    for layout in ["%d.%m.%Y", "%Y-%m-%d"]:
+        try:
+            return time.mktime(datetime.strptime(value, layout).timetuple())
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"Invalid date '{value}' (use dd.mm.YYYY or YYYY-mm-dd)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Galaxy log and session analytics")
+    parser.add_argument("paths", nargs="*", help="Log files or globs (default: LOG_FILE and its rotations)")
+    parser.add_argument("--index", help="Index file (default: <first log>.index.json)")
+    parser.add_argument("--no-index", action="store_true", help="Don't read or write the index")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the existing index and reparse everything")
+    parser.add_argument("--since", type=parse_date, help="Only sessions from this date (dd.mm.YYYY or YYYY-mm-dd)")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest sessions to show (default: 10)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Parallel parser processes")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    paths = args.paths or [os.getenv("LOG_FILE", "./logs.log")]
+    log_files = discover_logs(paths, expand_rotations=not args.paths)
+    if not log_files:
+        print(f"No log files found for: {' '.join(paths)}", file=sys.stderr)
+        sys.exit(1)
+
+    # Default next to the newest (live) log file
+    index_path = None if args.no_index else (args.index or f"{log_files[-1]}.index.json")
+    if index_path and args.rebuild and os.path.exists(index_path):
+        os.remove(index_path)
+
+    index, stats = build(log_files, index_path, args.jobs)
+    report = analyze(index, args.since, args.top)
+    elapsed = time.perf_counter() - start_time
+
+    if args.json:
+        json.dump(dict(report, build=dict(stats, seconds=elapsed)), sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report, stats, elapsed)
+
+if __name__ == "__main__":
+    main()
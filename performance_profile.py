@@ -0,0 +1,409 @@
+"""
+Performance profile for the streaming session.
+
+Applied when a stream reaches RUNNING and reverted when it leaves it:
+- CPU affinity for Moonlight, with the handler moved to the remaining CPUs
+- SCHED_FIFO (or a nice level) for Moonlight's decoder threads
+- Lower I/O priority for the handler's threads (synchronous log writes)
+- Optional CPU frequency governor switch (e.g. "performance")
+
+Every change is timed and logged with its before/after value. Changes that
+fail (missing privileges, non-Linux kernel) are logged and skipped; the rest
+of the profile still applies. Moonlight threads that start after the profile
+was applied are picked up by refresh(), and the pre-profile values that outlive
+the handler are exposed through `originals` so they can be journaled.
+"""
+import os
+import re
+import glob
+import time
+import threading
+from typing import Optional, List, Set, Dict, Any, Callable, Tuple
+
+import psutil
+
+GOVERNOR_GLOB = "/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_governor"
+
+IONICE_CLASSES = {
+    "idle": (psutil.IOPRIO_CLASS_IDLE, None) if hasattr(psutil, "IOPRIO_CLASS_IDLE") else None,
+    "low": (psutil.IOPRIO_CLASS_BE, 7) if hasattr(psutil, "IOPRIO_CLASS_BE") else None,
+}
+
+def parse_cpu_list(value: str) -> Set[int]:
+    """Parse a CPU list like "2,3" or "1-3" into a set of CPU numbers"""
+    cpus = set()
+    for part in value.replace(" ", "").split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+def _thread_ids(pid: int) -> List[int]:
+    try:
+        return [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        return [pid]
+
+def _thread_name(tid: int) -> str:
+    try:
+        with open(f"/proc/{tid}/comm", "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+class PerformanceProfile:
+    """Applies and reverts scheduling, affinity, I/O and governor tuning"""
+
+    def __init__(self, logger,
+                 moonlight_cpus: Optional[Set[int]] = None,
+                 sched_policy: str = "none",
+                 rt_priority: int = 10,
+                 nice: int = -10,
+                 decoder_thread_pattern: str = "",
+                 handler_ionice: str = "none",
+                 cpu_governor: str = ""):
+        if sched_policy == "fifo" and not decoder_thread_pattern:
+            # Equal-priority FIFO threads don't time-slice; a busy one would starve Moonlight's
+            # main, audio and network threads on the pinned CPUs
+            raise ValueError("SCHED_FIFO needs a decoder thread pattern (PERF_DECODER_THREADS)")
+        if sched_policy not in ["fifo", "nice", "none"]:
+            raise ValueError(f"Unknown scheduling policy: {sched_policy}")
+
+        self.logger = logger
+        self.moonlight_cpus = moonlight_cpus or set()
+        self.sched_policy = sched_policy
+        self.rt_priority = rt_priority
+        self.nice = nice
+        self.decoder_thread_pattern = re.compile(decoder_thread_pattern) if decoder_thread_pattern else None
+        self.handler_ionice = handler_ionice
+        self.cpu_governor = cpu_governor
+        self.pid = None
+        self._lock = threading.RLock()  # apply/revert run on state changes, refresh on the process monitor
+        self._undo: List[Tuple[str, Callable[[], None]]] = []
+        self._pinned: Set[int] = set()
+        self._scheduled: Set[int] = set()
+        # Pre-profile values of what outlives the handler (Moonlight threads, governor),
+        # keyed by TID or sysfs path as strings so they can be journaled
+        self._originals: Dict[str, Dict[str, Any]] = {"affinity": {}, "nice": {}, "sched": {}, "governor": {}}
+
+    @property
+    def active(self) -> bool:
+        return self.pid is not None or bool(self._undo)
+
+    @property
+    def originals(self) -> Dict[str, Dict[str, Any]]:
+        """Pre-profile values to journal, so a restarted handler can still revert them"""
+        with self._lock:
+            return {kind: dict(values) for kind, values in self._originals.items() if values}
+
+    def adopt(self, originals: Optional[Dict[str, Dict[str, Any]]]):
+        """Use pre-profile values journaled by a previous handler instead of reading the already tuned ones"""
+        with self._lock:
+            for kind, values in (originals or {}).items():
+                if kind in self._originals:
+                    self._originals[kind].update(values)
+
+    def revert_saved(self, pid: Optional[int] = None):
+        """Put back adopted values without applying: the governor, plus thread values if `pid` still runs"""
+        with self._lock:
+            if pid is not None:
+                self._restore_threads(pid)
+
+            restored = 0
+            for path, governor in self._originals["governor"].items():
+                try:
+                    with open(path, "w") as f:
+                        f.write(governor)
+                    restored += 1
+                except OSError as e:
+                    self.logger.warning(f"Could not restore CPU governor {governor} for {path}: {e}")
+            if restored:
+                self.logger.info(f"Restored CPU governor from the previous session ({restored} CPUs)")
+            for values in self._originals.values():
+                values.clear()
+
+    def _restore_threads(self, pid: int):
+        # Only TIDs that still belong to the (verified) Moonlight process; others may have been reused
+        tids = {str(tid) for tid in _thread_ids(pid)}
+        restored = 0
+        for kind, values in self._originals.items():
+            for tid, previous in values.items():
+                if kind == "governor" or tid not in tids:
+                    continue
+                try:
+                    if kind == "affinity":
+                        os.sched_setaffinity(int(tid), previous)
+                    elif kind == "nice":
+                        os.setpriority(os.PRIO_PROCESS, int(tid), previous)
+                    else:
+                        policy, priority = previous
+                        os.sched_setscheduler(int(tid), policy, os.sched_param(priority))
+                    restored += 1
+                except OSError as e:
+                    self.logger.warning(f"Could not restore {kind} of Moonlight thread {tid}: {e}")
+        if restored:
+            self.logger.info(f"Restored {restored} Moonlight thread settings from the previous session")
+
+    def apply(self, pid: int):
+        """Apply the profile to a running Moonlight process"""
+        with self._lock:
+            if self.active:
+                self.revert()
+
+            start_time = time.perf_counter()
+            self.logger.info(f"Applying performance profile to Moonlight (PID: {pid})...")
+            self.pid = pid
+            tids = _thread_ids(pid)
+
+            if self.moonlight_cpus:
+                self._measure("Moonlight CPU affinity", self._pin_moonlight, tids)
+                self._measure("Handler CPU isolation", self._isolate_handler)
+            if self.sched_policy in ["fifo", "nice"]:
+                self._measure(f"Decoder thread scheduling ({self.sched_policy})",
+                              self._schedule_decoder_threads, self._decoder_threads(tids))
+            if self.handler_ionice in IONICE_CLASSES:
+                self._measure(f"Handler I/O priority ({self.handler_ionice})", self._lower_handler_ionice)
+            if self.cpu_governor:
+                self._measure(f"CPU governor ({self.cpu_governor})", self._set_governor)
+
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            self.logger.info(f"Performance profile applied: {len(self._undo)} changes in {elapsed_ms:.1f}ms")
+
+    def refresh(self, pid: int) -> bool:
+        """Tune Moonlight threads started since apply() (decoders start with the stream); True if any changed"""
+        with self._lock:
+            if self.pid != pid:
+                return False
+
+            count = len(self._undo)
+            tids = _thread_ids(pid)
+            new_tids = [tid for tid in tids if tid not in self._pinned]
+            if self.moonlight_cpus and new_tids:
+                self._measure("Moonlight CPU affinity (new threads)", self._pin_moonlight, new_tids)
+            decoder_tids = self._decoder_threads(tids) if self.sched_policy in ["fifo", "nice"] else []
+            if decoder_tids:
+                self._measure(f"Decoder thread scheduling ({self.sched_policy}, new threads)",
+                              self._schedule_decoder_threads, decoder_tids)
+            return len(self._undo) > count
+
+    def revert(self):
+        """Undo every applied change in reverse order"""
+        with self._lock:
+            self.pid = None
+            self._pinned.clear()
+            self._scheduled.clear()
+            if not self._undo:
+                return
+
+            start_time = time.perf_counter()
+            count = len(self._undo)
+            while self._undo:
+                description, undo = self._undo.pop()
+                step_start = time.perf_counter()
+                try:
+                    undo()
+                    self.logger.debug(f"Reverted {description} ({(time.perf_counter() - step_start) * 1000:.1f}ms)")
+                except (OSError, psutil.Error) as e:
+                    # The Moonlight process is usually gone by now; nothing left to undo
+                    self.logger.debug(f"Could not revert {description}: {e}")
+            for values in self._originals.values():
+                values.clear()
+
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            self.logger.info(f"Performance profile reverted: {count} changes in {elapsed_ms:.1f}ms")
+
+    def _measure(self, description: str, func, *args):
+        """Run one tuning step, logging its before/after values and duration"""
+        step_start = time.perf_counter()
+        try:
+            result = func(*args)
+        except (OSError, psutil.Error, AttributeError, ValueError) as e:
+            self.logger.warning(f"Could not apply {description}: {e}")
+            return
+
+        elapsed_ms = (time.perf_counter() - step_start) * 1000
+        if result is None:
+            self.logger.debug(f"Skipped {description}: nothing to change")
+            return
+
+        before, after, undo = result
+        self._undo.append((description, undo))
+        self.logger.info(f"Applied {description}: {before} → {after} ({elapsed_ms:.1f}ms)")
+
+    def _decoder_threads(self, tids: List[int]) -> List[int]:
+        # Names are checked again on every refresh; threads may be renamed after they start
+        return [tid for tid in tids if tid not in self._scheduled
+                and (not self.decoder_thread_pattern or self.decoder_thread_pattern.search(_thread_name(tid)))]
+
+    def _baseline(self, saved: Dict[str, Any]):
+        # Threads started after Moonlight's main thread was tuned inherited the tuned value;
+        # its original is what they would have had otherwise
+        return saved.get(str(self.pid))
+
+    def _pin_moonlight(self, tids: List[int]):
+        saved = self._originals["affinity"]
+        baseline = self._baseline(saved)
+        changed = []
+
+        def undo():
+            for tid in changed:
+                try:
+                    os.sched_setaffinity(tid, saved[str(tid)])
+                except ProcessLookupError:
+                    pass
+
+        # Seen even if this fails, so refresh() doesn't retry (and warn) every tick
+        self._pinned.update(tids)
+        try:
+            for tid in tids:
+                try:
+                    saved.setdefault(str(tid), baseline or sorted(os.sched_getaffinity(tid)))
+                    os.sched_setaffinity(tid, self.moonlight_cpus)
+                    changed.append(tid)
+                except ProcessLookupError:
+                    continue
+        except OSError:
+            # Don't leave some threads pinned when a later one fails (EPERM, EINVAL for offline CPUs)
+            undo()
+            raise
+        if not changed:
+            return None
+
+        before = saved[str(changed[0])]
+        return f"CPUs {before}", f"CPUs {sorted(self.moonlight_cpus)} ({len(changed)} threads)", undo
+
+    def _isolate_handler(self):
+        available = os.sched_getaffinity(0)
+        remaining = available - self.moonlight_cpus
+        if not remaining:
+            self.logger.warning("No CPUs left for the handler outside the Moonlight set, not isolating")
+            return None
+
+        for tid in _thread_ids(os.getpid()):
+            try:
+                os.sched_setaffinity(tid, remaining)
+            except ProcessLookupError:
+                continue
+
+        def undo():
+            # Threads started during the session inherited the reduced set, so revert all current ones
+            for tid in _thread_ids(os.getpid()):
+                try:
+                    os.sched_setaffinity(tid, available)
+                except ProcessLookupError:
+                    pass
+
+        return f"CPUs {sorted(available)}", f"CPUs {sorted(remaining)}", undo
+
+    def _schedule_decoder_threads(self, tids: List[int]):
+        if not tids:
+            return None
+
+        fifo = self.sched_policy == "fifo"
+        saved = self._originals["sched" if fifo else "nice"]
+        baseline = self._baseline(saved)
+        changed = []
+
+        def undo():
+            for tid in changed:
+                previous = saved[str(tid)]
+                try:
+                    if fifo:
+                        policy, priority = previous
+                        os.sched_setscheduler(tid, policy, os.sched_param(priority))
+                    else:
+                        os.setpriority(os.PRIO_PROCESS, tid, previous)
+                except ProcessLookupError:
+                    pass
+
+        self._scheduled.update(tids)
+        try:
+            for tid in tids:
+                try:
+                    if fifo:
+                        saved.setdefault(str(tid), baseline or [os.sched_getscheduler(tid), os.sched_getparam(tid).sched_priority])
+                        os.sched_setscheduler(tid, os.SCHED_FIFO, os.sched_param(self.rt_priority))
+                    else:
+                        saved.setdefault(str(tid), os.getpriority(os.PRIO_PROCESS, tid) if baseline is None else baseline)
+                        os.setpriority(os.PRIO_PROCESS, tid, self.nice)
+                    changed.append(tid)
+                except ProcessLookupError:
+                    continue
+        except OSError:
+            # Don't leave some threads rescheduled when a later one fails (usually EPERM)
+            undo()
+            raise
+        if not changed:
+            return None
+
+        previous = [saved[str(tid)] for tid in changed]
+        if fifo:
+            after = f"SCHED_FIFO priority {self.rt_priority}"
+            before = "SCHED_OTHER" if all(p == os.SCHED_OTHER for p, _ in previous) else "mixed policies"
+        else:
+            after = f"nice {self.nice}"
+            before = f"nice {sorted(set(previous))}"
+        return before, f"{after} ({len(changed)} threads)", undo
+
+    def _lower_handler_ionice(self):
+        ioclass = IONICE_CLASSES[self.handler_ionice]
+        if ioclass is None:
+            return None
+
+        # I/O priority is per thread; set it on every handler thread that writes logs
+        before = psutil.Process().ionice()
+        tids = _thread_ids(os.getpid())
+        for tid in tids:
+            try:
+                psutil.Process(tid).ionice(*ioclass)
+            except psutil.NoSuchProcess:
+                continue
+
+        def undo():
+            value = before.value if before.ioclass in [psutil.IOPRIO_CLASS_RT, psutil.IOPRIO_CLASS_BE] else None
+            # Re-enumerate: threads started during the session inherited the lowered class
+            for tid in _thread_ids(os.getpid()):
+                try:
+                    psutil.Process(tid).ionice(before.ioclass, value)
+                except psutil.NoSuchProcess:
+                    pass
+
+        before_class = getattr(before.ioclass, "name", before.ioclass)
+        return f"{before_class}", f"{getattr(ioclass[0], 'name', ioclass[0])} ({len(tids)} threads)", undo
+
+    def _set_governor(self):
+        paths = sorted(glob.glob(GOVERNOR_GLOB))
+        if not paths:
+            return None
+
+        # A journaled original wins over the current value, which may be our own earlier write
+        saved = self._originals["governor"]
+        changed = {}
+
+        def undo():
+            for path, governor in changed.items():
+                with open(path, "w") as f:
+                    f.write(governor)
+
+        try:
+            for path in paths:
+                with open(path, "r") as f:
+                    current = f.read().strip()
+                previous = saved.get(path, current)
+                if current != self.cpu_governor:
+                    with open(path, "w") as f:
+                        f.write(self.cpu_governor)
+                if previous != self.cpu_governor:
+                    saved[path] = changed[path] = previous
+        except OSError:
+            # Don't leave some CPUs switched when a later one fails (usually EACCES)
+            undo()
+            raise
+        if not changed:
+            return None
+
+        return f"{sorted(set(changed.values()))}", f"{self.cpu_governor} ({len(changed)} CPUs)", undo
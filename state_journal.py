@@ -0,0 +1,122 @@
+"""
+Crash-safe state journal for the button handler.
+
+Keeps a small JSON snapshot of the handler state (StreamState value, Moonlight
+PID and start time, host, session start, retry counters) so a restarted
+handler can re-adopt a live session immediately.
+
+Writes are atomic (temp file + fsync + rename) and batched: record() only
+updates memory and wakes a flusher thread, which writes at most once per
+flush interval no matter how many updates arrived in between.
+"""
+import os
+import json
+import time
+import threading
+from typing import Optional, Dict, Any
+
+JOURNAL_VERSION = 2  # 2: PID start time in clock ticks instead of create time
+
+class StateJournal:
+    """Atomic, fsync-batched JSON journal of the handler state"""
+
+    def __init__(self, path: str, flush_interval: float = 1.0, on_error=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.on_error = on_error  # called with the exception when a background flush fails
+        self.writes = 0
+        self._data: Dict[str, Any] = {}
+        self._dirty = False
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # serializes writers sharing the temp file
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._thread = None
+
+    @staticmethod
+    def load(path: str) -> Optional[Dict[str, Any]]:
+        """Read a journal; None if missing, unreadable or from another version"""
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(data, dict) or data.get("version") != JOURNAL_VERSION:
+            return None
+        return data
+
+    def start(self, initial: Optional[Dict[str, Any]] = None):
+        """Seed the journal and start the background flusher"""
+        with self._lock:
+            self._data = dict(initial or {})
+            self._dirty = True
+        self._thread = threading.Thread(target=self._flush_loop, name="StateJournal", daemon=True)
+        self._thread.start()
+
+    def record(self, **fields):
+        """Update journal fields; the change is persisted by the next batched flush"""
+        with self._lock:
+            self._data.update(fields)
+            self._dirty = True
+            self._wakeup.notify()
+
+    def flush(self):
+        """Write pending changes now (atomic replace, fsync'd)"""
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = dict(self._data, version=JOURNAL_VERSION, saved_at=time.time())
+                self._dirty = False
+                self._last_flush = time.monotonic()
+            self._write(snapshot)
+
+    def close(self):
+        """Flush outstanding changes and stop the flusher"""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while not self._dirty and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                # Batch: let further updates accumulate until the interval has passed
+                delay = self.flush_interval - (time.monotonic() - self._last_flush)
+                if delay > 0:
+                    self._wakeup.wait(delay)
+                    continue
+            try:
+                self.flush()
+            except Exception as e:
+                with self._lock:
+                    self._dirty = True
+                    self._last_flush = time.monotonic()
+                if self.on_error:
+                    self.on_error(e)
+
+    def _write(self, data: Dict[str, Any]):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        temp_path = f"{self.path}.tmp"
+
+        with open(temp_path, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+        # Persist the rename itself
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        self.writes += 1
@@ -0,0 +1,14 @@
+"""
+Stream states shared by the button handler, the fleet coordinator's load test
+and anything else that reports a unit's state (values are what the coordinator stores).
+"""
+from enum import Enum
+
+class StreamState(Enum):
+    """Enumeration for stream states"""
+    IDLE = "idle"
+    STARTING = "starting"
+    RUNNING = "running"
+    STOPPING = "stopping"
+    ERROR = "error"
+    UNKNOWN = "unknown"